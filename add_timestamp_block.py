@@ -1,19 +1,33 @@
 from datetime import datetime
-from tzlocal import get_localzone
+from time import time
 from nio import Block
 from nio.block.mixins import EnrichSignals
-from nio.block.mixins.enrich.enrich_signals import EnrichProperties
-from nio.properties import BoolProperty, ObjectProperty, StringProperty, \
-    VersionProperty
+from nio.block.terminals import DEFAULT_TERMINAL, output
+from nio.command import command
+from nio.properties import BoolProperty, ObjectProperty, PropertyHolder, \
+    SelectProperty, StringProperty, TimeDeltaProperty, VersionProperty
+from .enrich import CustomEnrichProperties
+from .expressions import is_expression
+from .instrumentation import Instrumentation
+from .lazy_timestamp import LazyTimestamp, LazyTimestampSignal
+from .timestamp_engine import OffsetFormat, OffsetWindow, Precision, \
+    TimestampFormat, PRECISION_SCALES, compile_iso, compile_strftime, \
+    get_timezone, monotonic_ns, time_ns
 
 
-class CustomEnrichProperties(EnrichProperties):
-    """ Overrides default enrichment to include existing fields."""
+class Clocks(PropertyHolder):
 
-    exclude_existing = BoolProperty(title='Exclude Existing?', default=False)
+    iso = BoolProperty(title='ISO 8601', default=True, order=0)
+    epoch_ns = BoolProperty(title='Epoch Nanoseconds', default=False, order=1)
+    monotonic_ns = BoolProperty(
+        title='Monotonic Nanoseconds', default=False, order=2)
 
 
-class AddTimestamp(EnrichSignals, Block):
+@command('refresh_timezone')
+@command('metrics')
+@output('metrics', label='Metrics')
+@output(DEFAULT_TERMINAL, default=True, label='default')
+class AddTimestamp(Instrumentation, EnrichSignals, Block):
 
     utc = BoolProperty(title='UTC', default=True)
 
@@ -27,6 +41,56 @@ class AddTimestamp(EnrichSignals, Block):
         default=True,
         order=1,
         advanced=True)
+    clocks = ObjectProperty(
+        Clocks,
+        title='Clocks',
+        default=Clocks(),
+        order=2,
+        advanced=True)
+    output_format = SelectProperty(
+        TimestampFormat,
+        title='Format',
+        default=TimestampFormat.ISO,
+        order=3,
+        advanced=True)
+    precision = SelectProperty(
+        Precision,
+        title='Precision',
+        default=Precision.MILLISECONDS,
+        order=4,
+        advanced=True)
+    utc_offset = SelectProperty(
+        OffsetFormat,
+        title='UTC Offset Format',
+        default=OffsetFormat.DEFAULT,
+        order=5,
+        advanced=True)
+    strftime = StringProperty(
+        title='strftime Pattern',
+        default='%Y-%m-%dT%H:%M:%S%z',
+        order=6,
+        advanced=True)
+    lazy = BoolProperty(
+        title='Lazy Formatting',
+        default=False,
+        order=7,
+        advanced=True)
+    timezone = StringProperty(
+        title='Timezone',
+        default='',
+        allow_none=True,
+        order=8,
+        advanced=True)
+    in_place = BoolProperty(
+        title='Modify Signals In Place',
+        default=False,
+        order=9,
+        advanced=True)
+    coalesce = TimeDeltaProperty(
+        title='Coalesce Tolerance',
+        default={'seconds': 0},
+        order=10,
+        advanced=True)
 
     enrich = ObjectProperty(
         CustomEnrichProperties,
@@ -34,71 +98,218 @@ class AddTimestamp(EnrichSignals, Block):
         default=CustomEnrichProperties(),  # use custom default
         order=100,
         advanced=True)
-    version = VersionProperty('0.1.0')
+    version = VersionProperty('0.2.0')
+
+    def configure(self, context):
+        super().configure(context)
+        # resolve the local timezone once, not for every list of signals
+        self._tz = None if self.utc() else self._resolve_timezone()
+        self._compile_formatter()
+        # (clock tick, rendered timestamp) of the most recent call
+        self._cache = (None, None)
+        self._iso = self.clocks().iso()
+        self._epoch_ns = self.clocks().epoch_ns()
+        self._monotonic_ns = self.clocks().monotonic_ns()
+        # reuse the stamps of calls within the tolerance of each other
+        self._tolerance_ns = int(self.coalesce().total_seconds() * 1e9)
+        self._coalesced = (0, None)
+        self._get_stamps = self._sample_stamps
+        if self._tolerance_ns > 0:
+            self._get_stamps = self._get_stamps_coalesced
+        in_place = self.in_place()
+        if in_place and (self.enrich().exclude_existing() or
+                         self.enrich().enrich_field()):
+            self.logger.warning('Signals are only modified in place when '
+                                'existing fields are included and there is '
+                                'no results field')
+            in_place = False
+        self._lazy = self.lazy()
+        if self._lazy and (self.enrich().enrich_field() or in_place):
+            self.logger.warning('Lazy formatting is not supported with a '
+                                'results field or when signals are '
+                                'modified in place')
+            self._lazy = False
+        # skip evaluating `output_attr` for each signal unless it is an
+        # expression
+        if is_expression(context.properties.get('output_attr')):
+            self._output_attr = None
+            self._enrich_signals = self._enrich_signals_dynamic
+        else:
+            self._output_attr = self.output_attr()
+            self._enrich_signals = self._enrich_signals_static
+        if in_place:
+            self._enrich_signals = self._enrich_signals_in_place
+
+    def refresh_timezone(self):
+        """ Resolve the local timezone again, after it has been changed on
+            the system while the block is running."""
+        if self._tz is not None:
+            self._tz = self._resolve_timezone(refresh=True)
+            self._compile_formatter()
+            self._cache = (None, None)
+        return {'timezone': None if self._tz is None else str(self._tz)}
+
+    def _resolve_timezone(self, refresh=False):
+        """ Return the configured timezone, or the local timezone."""
+        name = self.timezone()
+        if name:
+            try:
+                return get_timezone(name)
+            except ImportError:
+                self.logger.warning('Timezone names require Python 3.9, '
+                                    'using the local timezone')
+        return get_timezone(refresh=refresh)
 
     def process_signals(self, signals):
-        current_time = self._get_current_time()
+        if self._metrics_enabled:
+            output_signals = self._process_signals_instrumented(signals)
+        else:
+            stamps = self._get_stamps()
+            output_signals = self._enrich_signals(signals, stamps)
+        if self._lazy:
+            # render lazy timestamps when read, see LazyTimestampSignal
+            output_signals = [
+                LazyTimestampSignal(output_signal.__dict__)
+                for output_signal in output_signals
+            ]
+        self.notify_signals(output_signals)
+
+    def _process_signals_instrumented(self, signals):
+        """ Same as `process_signals`, recording metrics."""
+        self._record_list(signals)
+        timer = self._start_timer('clock')
+        stamps = self._get_stamps()
+        self._stop_timer('clock', timer)
+        timer = self._start_timer('enrich')
+        output_signals = self._enrich_signals(signals, stamps)
+        self._stop_timer('enrich', timer)
+        return output_signals
+
+    def _get_stamps_coalesced(self):
+        """ Return the stamps of a previous call if it was within the
+            coalesce tolerance, otherwise sample new ones."""
+        now = monotonic_ns()
+        expires, stamps = self._coalesced
+        if now >= expires:
+            stamps = self._sample_stamps()
+            self._coalesced = (now + self._tolerance_ns, stamps)
+        return stamps
+
+    def _sample_stamps(self):
+        """ Return a list of `(attribute suffix, value)` tuples, one for
+            each of the selected clocks."""
+        stamps = []
+        if self._iso:
+            stamps.append(('', self._get_current_time()))
+        if self._epoch_ns:
+            stamps.append(('_epoch_ns', time_ns()))
+        if self._monotonic_ns:
+            stamps.append(('_monotonic_ns', monotonic_ns()))
+        return stamps
+
+    def _enrich_signals_static(self, signals, stamps):
+        """ Return signals enriched with `stamps` in constant attributes."""
+        stamps = [(self._output_attr + suffix, value)
+                  for suffix, value in stamps]
+        return [
+            self.get_output_signal(dict(stamps), signal)
+            for signal in signals
+        ]
+
+    def _enrich_signals_in_place(self, signals, stamps):
+        """ Return the same signals with `stamps` set on them, instead of
+            copying each signal."""
+        if self._output_attr is not None:
+            stamps = [(self._output_attr + suffix, value)
+                      for suffix, value in stamps]
+            for signal in signals:
+                for attr, value in stamps:
+                    setattr(signal, attr, value)
+        else:
+            for signal in signals:
+                output_attr = self.output_attr(signal)
+                for suffix, value in stamps:
+                    setattr(signal, output_attr + suffix, value)
+        return signals
+
+    def _enrich_signals_dynamic(self, signals, stamps):
+        """ Return signals enriched with `stamps` in attributes evaluated
+            for each signal."""
         output_signals = []
         for signal in signals:
+            output_attr = self.output_attr(signal)
             signal_dict = {
-                self.output_attr(signal): current_time,
+                output_attr + suffix: value for suffix, value in stamps
             }
             output_signal = self.get_output_signal(signal_dict, signal)
             output_signals.append(output_signal)
-        self.notify_signals(output_signals)
+        return output_signals
 
-    def _get_current_time(self):
-        """ Return an ISO-formatted string. Helper `_truncate_` functions
-            are to support Python < 3.6, after which `datetime.isoformat()`
-            takes a `timespec` arg."""
-        if self.utc():
-            now = datetime.utcnow()
-            if not self.milliseconds():
-                now = self._truncate_fractional_seconds(now)
-                current_time = now.isoformat() + 'Z'
-            else:
-                current_time = now.isoformat()
-                current_time = self._truncate_microseconds(current_time) + 'Z'
-            return current_time
-        # get local timestamp
-        now = datetime.now()
+    def _compile_formatter(self):
+        """ Choose a clock sampling function and compile a function to
+            render its ticks in the configured format."""
+        precision = self.precision()
         if not self.milliseconds():
-            now = self._truncate_fractional_seconds(now)
-            current_time = str(self._localize_time(now))
+            precision = Precision.SECONDS
+        output_format = self.output_format()
+        if output_format is TimestampFormat.EPOCH:
+            # integer ticks are already the formatted value
+            self._divisor = 10**9 // PRECISION_SCALES[precision]
+            self._sample = self._sample_epoch
+            self._render = int
+        elif output_format is TimestampFormat.ISO and \
+                precision is Precision.NANOSECONDS:
+            self._sample = time_ns
+            self._render = compile_iso(precision, self.utc_offset(), self._tz)
         else:
-            current_time = str(self._localize_time(now))
-            current_time = self._truncate_microseconds(current_time)
-        # remove colon from TZ info (±HHMM format)
-        # TODO: Add options for formats ±HH:MM, ±HH
-        current_time = ''.join(current_time.rsplit(':', maxsplit=1))
-        return current_time
+            # datetimes have a resolution of microseconds
+            self._divisor = {
+                Precision.SECONDS: 10**6,
+                Precision.MILLISECONDS: 10**3,
+            }.get(precision, 1)
+            self._sample = self._sample_datetime
+            if self._tz is not None:
+                self._window = OffsetWindow(self._tz)
+            if output_format is TimestampFormat.STRFTIME:
+                self._render = compile_strftime(self.strftime(), self._tz)
+            else:
+                self._render = compile_iso(
+                    precision, self.utc_offset(), self._tz)
 
-    @staticmethod
-    def _localize_time(now):
-        """ Return datetime `now` with local timezone."""
-        current_time_with_tz = get_localzone().localize(now)
-        current_time = current_time_with_tz.isoformat()
+    def _get_current_time(self):
+        """ Return the current time in the configured format. It is only
+            rendered once per clock tick (of the configured precision),
+            calls within the same tick reuse it. With lazy formatting a
+            `LazyTimestamp` is returned, which renders on first use."""
+        tick = self._sample()
+        cached_tick, current_time = self._cache
+        if tick != cached_tick:
+            if self._lazy:
+                current_time = LazyTimestamp(tick, self._format_time)
+            else:
+                current_time = self._format_time(tick)
+            self._cache = (tick, current_time)
         return current_time
 
-    @staticmethod
-    def _truncate_fractional_seconds(now):
-        """ Return a datetime equal to `now` with `microsecond=0`"""
-        now = datetime(
-            year=now.year,
-            month=now.month,
-            day=now.day,
-            hour=now.hour,
-            minute=now.minute,
-            second=now.second,
-            microsecond=0)
+    def _sample_datetime(self):
+        """ Return the current datetime truncated to the configured
+            precision, naive UTC or local time with a fixed offset."""
+        if self._tz is None:
+            now = datetime.utcnow()
+        else:
+            seconds = time()
+            now = datetime.fromtimestamp(
+                seconds, self._window.tzinfo(seconds))
+        if self._divisor > 1:
+            microsecond = now.microsecond
+            now = now.replace(
+                microsecond=microsecond - microsecond % self._divisor)
         return now
 
-    @staticmethod
-    def _truncate_microseconds(timestamp):
-        """ Remove microseconds from string `timestamp`"""
-        base, suffix = timestamp.split('.')
-        microseconds, offset = suffix[:6], suffix[6:]
-        milliseconds = microseconds[:3]
-        suffix = milliseconds + offset
-        timestamp = '.'.join([base, suffix])
-        return timestamp
+    def _sample_epoch(self):
+        """ Return the current epoch time in the configured precision."""
+        return time_ns() // self._divisor
+
+    def _format_time(self, tick):
+        """ Return a clock tick in the configured format."""
+        return self._render(tick)
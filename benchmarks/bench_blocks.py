@@ -0,0 +1,153 @@
+""" Throughput and allocation benchmarks for the blocks in this collection.
+
+    Run from the directory containing this block collection:
+
+        python -m timestamps.benchmarks.bench_blocks [--save] [--compare]
+
+    `--save` stores the results in `baseline.json` next to this file, and
+    `--compare` exits with an error if any benchmark is slower than the
+    stored baseline by more than `--tolerance`, or if no baseline has been
+    saved yet.
+"""
+import json
+import os
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from itertools import product
+from time import perf_counter
+from unittest import TestLoader, TextTestRunner
+from nio import Signal
+from nio.testing.block_test_case import NIOBlockTestCase
+from ..add_timestamp_block import AddTimestamp
+from ..elapsed_time_block import ElapsedTime
+from .bench_parser import SHAPES
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+BATCH_SIZES = [1, 100, 10000, 100000]
+
+# benchmark name -> {'signals_per_sec': ..., 'bytes_per_signal': ...}
+results = {}
+
+
+def measure(name, process, signals, total):
+    """ Call `process` with `signals` until `total` signals have been
+        processed and store the throughput, then call it once more while
+        tracing memory allocations."""
+    repeat = max(1, total // len(signals))
+    process(signals)  # warm up any caches
+    start = perf_counter()
+    for _ in range(repeat):
+        process(signals)
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    process(signals)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results[name] = {
+        'signals_per_sec': repeat * len(signals) / elapsed,
+        'bytes_per_signal': peak / len(signals),
+    }
+
+
+class BlockBenchmarks(NIOBlockTestCase):
+
+    def signals_notified(self, block, signals, output_id):
+        """ Discard notified signals so that memory use stays flat."""
+        pass
+
+    def test_add_timestamp(self):
+        for utc, milliseconds, batch_size in product(
+                (True, False), (True, False), BATCH_SIZES):
+            blk = AddTimestamp()
+            self.configure_block(blk, {
+                'utc': utc,
+                'milliseconds': milliseconds,
+            })
+            blk.start()
+            signals = [Signal({'foo': 'bar'}) for _ in range(batch_size)]
+            measure(
+                'AddTimestamp utc={} milliseconds={} batch={}'.format(
+                    utc, milliseconds, batch_size),
+                blk.process_signals, signals, total=100000)
+            blk.stop()
+
+    def test_elapsed_time(self):
+        shapes = SHAPES + [('epoch', 452400300)]
+        for (shape, timestamp), milliseconds, units in product(
+                shapes, (True, False), product((False, True), repeat=4)):
+            blk = ElapsedTime()
+            self.configure_block(blk, {
+                'timestamp_a': '{{ $a }}',
+                'timestamp_b': '{{ $b }}',
+                'milliseconds': milliseconds,
+                'units': dict(zip(
+                    ['days', 'hours', 'minutes', 'seconds'], units)),
+            })
+            blk.start()
+            signals = [
+                Signal({'a': timestamp, 'b': timestamp}) for _ in range(100)]
+            measure(
+                'ElapsedTime shape={} milliseconds={} units={}'.format(
+                    shape, milliseconds,
+                    ''.join('dhms'[i] for i, unit in enumerate(units)
+                            if unit) or '-'),
+                blk.process_signals, signals, total=10000)
+            blk.stop()
+
+
+def compare(baseline, tolerance):
+    """ Returns a list of descriptions of regressions against `baseline`"""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        expected = baseline[name]['signals_per_sec']
+        if result['signals_per_sec'] < expected * (1 - tolerance):
+            regressions.append(
+                '{}: {:.0f} signals/sec, baseline {:.0f}'.format(
+                    name, result['signals_per_sec'], expected))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--save', action='store_true',
+                        help='store results as the new baseline')
+    parser.add_argument('--compare', action='store_true',
+                        help='fail if results are slower than the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed fraction slower than the baseline')
+    args = parser.parse_args()
+    if args.compare and not os.path.exists(BASELINE):
+        # checked before running the benchmarks, which take a while
+        print('No baseline to compare with at {}, run with --save first'
+              .format(BASELINE), file=sys.stderr)
+        return 2
+
+    suite = TestLoader().loadTestsFromTestCase(BlockBenchmarks)
+    if not TextTestRunner().run(suite).wasSuccessful():
+        return 1
+    row = '{:<60} {:>14} {:>14}'
+    print(row.format('benchmark', 'signals/sec', 'bytes/signal'))
+    for name, result in sorted(results.items()):
+        print(row.format(
+            name,
+            '{:.0f}'.format(result['signals_per_sec']),
+            '{:.0f}'.format(result['bytes_per_signal'])))
+
+    if args.compare:
+        with open(BASELINE) as baseline_file:
+            regressions = compare(json.load(baseline_file), args.tolerance)
+        if regressions:
+            print('\nRegressions:\n' + '\n'.join(regressions))
+            return 1
+    if args.save:
+        with open(BASELINE, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+""" Import time and instantiation benchmarks for the blocks in this
+    collection.
+
+    Run from the directory containing this block collection:
+
+        python -m timestamps.benchmarks.bench_import [--repeat N]
+
+    Each block module is imported in a new interpreter with
+    `python -X importtime`, the best cumulative import time of the module is
+    reported along with its heaviest imports, and whether any of the
+    optional dependencies that should only be imported on demand were
+    imported.
+"""
+import os
+import subprocess
+import sys
+from argparse import ArgumentParser
+from importlib import import_module
+from time import perf_counter
+
+
+MODULES = [
+    ('add_timestamp_block', 'AddTimestamp'),
+    ('elapsed_time_block', 'ElapsedTime'),
+    ('elapsed_time_histogram_block', 'ElapsedTimeHistogram'),
+    ('lateness_block', 'Lateness'),
+    ('stopwatch_block', 'Stopwatch'),
+]
+
+# only imported when configured to use them
+LAZY = ['tzlocal', 'pytz', 'numpy', 'concurrent.futures.process']
+
+COLLECTION = __package__.rsplit('.', 1)[0]
+COLLECTION_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def import_times(module):
+    """ Returns a dict of module name to cumulative import time in
+        microseconds, for importing `module` in a new interpreter."""
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=COLLECTION_DIR, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def instantiation_us(cls, number=1000):
+    """ Returns the time to create a block instance, in microseconds."""
+    start = perf_counter()
+    for _ in range(number):
+        cls()
+    return (perf_counter() - start) / number * 1e6
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of interpreters per module')
+    parser.add_argument('--top', type=int, default=5,
+                        help='number of heaviest imports to show')
+    args = parser.parse_args()
+
+    row = '{:<32} {:>12} {:>14}  {}'
+    print(row.format('module', 'import ms', 'instance us', 'lazy imported'))
+    heaviest = {}
+    for module, block in MODULES:
+        name = '{}.{}'.format(COLLECTION, module)
+        runs = [import_times(name) for _ in range(args.repeat)]
+        best = min(runs, key=lambda times: times[name])
+        cls = getattr(import_module(name), block)
+        print(row.format(
+            module,
+            '{:.1f}'.format(best[name] / 1000),
+            '{:.1f}'.format(instantiation_us(cls)),
+            ', '.join(lazy for lazy in LAZY if lazy in best) or '-'))
+        heaviest[module] = sorted(
+            ((cumulative, imported) for imported, cumulative in best.items()
+             if imported not in (name, COLLECTION) and '.' not in imported),
+            reverse=True)[:args.top]
+
+    for module, imports in heaviest.items():
+        print('\n{} heaviest imports:'.format(module))
+        for cumulative, imported in imports:
+            print('  {:<30} {:>8.1f} ms'.format(imported, cumulative / 1000))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+""" Compare `parse_timestamp` to the original `strptime` parser for every
+    timestamp shape accepted by ElapsedTime, along with the parser of the
+    timestamp engine (`ciso8601` when it is installed).
+
+    Run from the directory containing this block collection:
+
+        python -m timestamps.benchmarks.bench_parser
+"""
+from timeit import repeat
+from .. import timestamp_engine
+from ..timestamp_parser import parse_timestamp, strptime_timestamp
+
+
+SHAPES = [
+    ('Z', '1984-05-04T12:42:03Z'),
+    ('Z, ms', '1984-05-04T12:42:03.142Z'),
+    ('Z, us', '1984-05-04T12:42:03.142857Z'),
+    ('±HHMM', '1984-05-03T05:45:00+0545'),
+    ('±HHMM, ms', '1984-05-03T05:45:00.142+0545'),
+    ('±HHMM, us', '1984-05-03T05:45:00.142857+0545'),
+    ('±HH:MM', '1984-05-03T05:45:00+05:45'),
+    ('±HH:MM, ms', '1984-05-03T05:45:00.142+05:45'),
+    ('±HH:MM, us', '1984-05-03T05:45:00.142857+05:45'),
+]
+
+
+def best_of(func, timestamp, truncate, number):
+    """ Returns the best time per call, in microseconds."""
+    times = repeat(
+        lambda: func(timestamp, truncate), number=number, repeat=5)
+    return min(times) / number * 1e6
+
+
+def main(number=20000):
+    row = '{:<12} {:<9} {:>12} {:>12} {:>8} {:>12} {:>8}'
+    print('engine backend: {}'.format(timestamp_engine.BACKEND))
+    print(row.format('shape', 'truncate', 'strptime us', 'parser us',
+                     'speedup', 'engine us', 'speedup'))
+    for name, timestamp in SHAPES:
+        for truncate in (False, True):
+            if truncate and ('.142' not in timestamp or
+                             '.142857' in timestamp):
+                # not supported by the strptime parser
+                continue
+            old = best_of(strptime_timestamp, timestamp, truncate, number)
+            new = best_of(parse_timestamp, timestamp, truncate, number)
+            engine = best_of(timestamp_engine.parse_timestamp, timestamp,
+                             truncate, number)
+            print(row.format(
+                name, str(truncate), '{:.2f}'.format(old),
+                '{:.2f}'.format(new), '{:.1f}x'.format(old / new),
+                '{:.2f}'.format(engine), '{:.1f}x'.format(old / engine)))
+
+
+if __name__ == '__main__':
+    main()
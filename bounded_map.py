@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from time import monotonic
+
+
+class BoundedMap(object):
+    """ A mapping with at most `max_size` keys, where the least recently
+        set keys are evicted first, and keys that have not been set for
+        `ttl` seconds expire. Zero disables either limit.
+
+        Not thread-safe, callers are expected to hold a lock.
+    """
+
+    def __init__(self, max_size=0, ttl=0, clock=monotonic):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        # key -> (value, time set), least recently set first
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def get(self, key, default=None):
+        """ Returns the value of `key` or `default` if it is not present
+            or has expired."""
+        item = self._items.get(key)
+        if item is None:
+            return default
+        value, updated = item
+        if self._ttl and self._clock() - updated >= self._ttl:
+            del self._items[key]
+            return default
+        return value
+
+    def set(self, key, value):
+        """ Sets the value of `key` and returns a list of `(key, value)`
+            tuples that were expired or evicted to make room for it."""
+        items = self._items
+        now = self._clock()
+        if key in items:
+            del items[key]
+        items[key] = (value, now)
+        removed = self.expire(now)
+        if self._max_size:
+            while len(items) > self._max_size:
+                evicted_key, (evicted, _) = items.popitem(last=False)
+                removed.append((evicted_key, evicted))
+        return removed
+
+    def pop(self, key, default=None):
+        """ Removes `key` and returns its value, or `default`."""
+        value = self.get(key, default)
+        self._items.pop(key, None)
+        return value
+
+    def expire(self, now=None):
+        """ Removes and returns a list of `(key, value)` tuples of expired
+            keys, oldest first."""
+        expired = []
+        if not self._ttl:
+            return expired
+        if now is None:
+            now = self._clock()
+        items = self._items
+        while items:
+            key, (value, updated) = next(iter(items.items()))
+            if now - updated < self._ttl:
+                break
+            del items[key]
+            expired.append((key, value))
+        return expired
+
+    def items(self):
+        """ Returns a list of `(key, value)` tuples, least recently set
+            first."""
+        return [(key, value) for key, (value, _) in self._items.items()]
@@ -0,0 +1,107 @@
+from enum import Enum
+from nio.properties import BoolProperty, ObjectProperty, PropertyHolder, \
+    SelectProperty
+from .expressions import constant, is_expression
+from .timestamp_engine import UNIT_NANOSECONDS, DurationOptions
+
+
+class EpochUnits(Enum):
+    SECONDS = 'seconds'
+    MILLISECONDS = 'milliseconds'
+    MICROSECONDS = 'microseconds'
+    NANOSECONDS = 'nanoseconds'
+
+
+# number of each epoch unit in one second
+EPOCH_SCALES = {
+    EpochUnits.SECONDS: 1,
+    EpochUnits.MILLISECONDS: 10**3,
+    EpochUnits.MICROSECONDS: 10**6,
+    EpochUnits.NANOSECONDS: 10**9,
+}
+
+
+class Units(PropertyHolder):
+
+    weeks = BoolProperty(title='Weeks', default=False, order=0)
+    days = BoolProperty(title='Days', default=False, order=1)
+    hours = BoolProperty(title='Hours', default=False, order=2)
+    minutes = BoolProperty(title='Minutes', default=False, order=3)
+    seconds = BoolProperty(title='Seconds', default=True, order=4)
+    milliseconds = BoolProperty(
+        title='Milliseconds', default=False, order=5)
+    microseconds = BoolProperty(
+        title='Microseconds', default=False, order=6)
+    nanoseconds = BoolProperty(title='Nanoseconds', default=False, order=7)
+    iso_8601 = BoolProperty(
+        title='ISO 8601 Duration', default=False, order=8)
+
+
+def evaluate_options(units, truncate, signal=None):
+    """ Returns the `DurationOptions` of a `Units` property value for a
+        signal"""
+    return DurationOptions(
+        truncate,
+        *[getattr(units, unit)(signal) for unit, _ in UNIT_NANOSECONDS],
+        units.iso_8601(signal))
+
+
+class TimestampOptions(object):
+    """ How a block that computes durations between timestamps reads them.
+
+    `configure` sets `_epoch_scale` and binds `_get_truncate`, which returns
+    True if fractional seconds are ignored for a signal and is only
+    evaluated once when **Include Milliseconds** is not an expression.
+    """
+
+    milliseconds = BoolProperty(
+        title='Include Milliseconds',
+        default=True,
+        order=2,
+        advanced=True)
+    epoch_units = SelectProperty(
+        EpochUnits,
+        title='Epoch Units',
+        default=EpochUnits.SECONDS,
+        order=3,
+        advanced=True)
+
+    def configure(self, context):
+        super().configure(context)
+        self._epoch_scale = EPOCH_SCALES[self.epoch_units()]
+        self._get_truncate = self._evaluate_truncate
+        if not is_expression(context.properties.get('milliseconds')):
+            self._get_truncate = constant(self._evaluate_truncate())
+
+    def _evaluate_truncate(self, signal=None):
+        """ Returns True if fractional seconds are ignored for a signal"""
+        return not self.milliseconds(signal)
+
+
+class DurationUnits(TimestampOptions):
+    """ Output units and epoch units of a block that enriches signals with
+    durations between timestamps.
+
+    `configure` also binds `_get_options`, which returns the
+    `DurationOptions` for a signal and is only evaluated once when neither
+    **Units** nor **Include Milliseconds** is an expression.
+    """
+
+    units = ObjectProperty(
+        Units,
+        title='Units',
+        default=Units(),
+        order=1,
+        advanced=True)
+
+    def configure(self, context):
+        super().configure(context)
+        self._get_options = self._evaluate_options
+        if not is_expression(context.properties.get('milliseconds')) and \
+                not is_expression(context.properties.get('units')):
+            self._get_options = constant(self._evaluate_options())
+
+    def _evaluate_options(self, signal=None):
+        """ Returns the `DurationOptions` for a signal"""
+        return evaluate_options(
+            self.units(), self._get_truncate(signal), signal)
@@ -1,39 +1,182 @@
+from array import array
+from collections import defaultdict
+from copy import deepcopy
 from datetime import datetime, timezone
-from nio import Block
+from functools import lru_cache, partial
+from threading import Lock
+from nio import Block, Signal
 from nio.block.mixins import EnrichSignals
-from nio.block.mixins.enrich.enrich_signals import EnrichProperties
-from nio.properties import BoolProperty, ObjectProperty, PropertyHolder, \
-    StringProperty, VersionProperty
+from nio.block.mixins.enrich import enrich_signals
+from nio.block.terminals import DEFAULT_TERMINAL, output
+from nio.command import command
+from nio.properties import BoolProperty, IntProperty, ListProperty, \
+    ObjectProperty, Property, PropertyHolder, StringProperty, \
+    TimeDeltaProperty, VersionProperty
+from .bounded_map import BoundedMap
+from .duration_units import DurationUnits, TimestampOptions
+from .enrich import CustomEnrichProperties
+from .expressions import constant, is_expression
+from .instrumentation import Instrumentation
+from .timestamp_engine import elapsed_nanoseconds, elapsed_seconds, \
+    enabled_units, epoch_value, format_nanoseconds, has_fraction, \
+    is_number, is_timestamp_shape, iso_duration, load_timestamp, \
+    parse_timestamp, split_timestamp
 
+# NumPy is only imported when batch mode is configured, see `_import_numpy`
+np = None
 
-class CustomEnrichProperties(EnrichProperties):
-    """ Overrides default enrichment to include existing fields."""
-    exclude_existing = BoolProperty(title='Exclude Existing?', default=False)
 
+def _import_numpy():
+    """ Returns True if NumPy is available, importing it the first time."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # only required for batch mode
+            return False
+        np = numpy
+    return True
 
-class Units(PropertyHolder):
 
-    days = BoolProperty(title='Days', default=False, order=0)
-    hours = BoolProperty(title='Hours', default=False, order=1)
-    minutes = BoolProperty(title='Minutes', default=False, order=2)
-    seconds = BoolProperty(title='Seconds', default=True, order=3)
+class Parallel(PropertyHolder):
 
+    workers = IntProperty(title='Workers', default=0, order=0)
+    min_list_size = IntProperty(
+        title='Minimum List Size', default=10000, order=2)
+    chunk_size = IntProperty(title='Chunk Size', default=2000, order=3)
 
-class ElapsedTime(EnrichSignals, Block):
 
-    timestamp_a = StringProperty(title='Timestamp A', order=0)
-    timestamp_b = StringProperty(title='Timestamp B', order=1)
+class SincePrevious(PropertyHolder):
 
-    units = ObjectProperty(
-        Units,
-        title='Units',
-        default=Units(),
-        order=1,
+    enabled = BoolProperty(title='Enabled', default=False, order=0)
+    group_by = StringProperty(
+        title='Group By', default='', allow_none=True, order=1)
+    max_groups = IntProperty(title='Max Groups', default=10000, order=2)
+    timeout = TimeDeltaProperty(
+        title='Group Timeout', default={'seconds': 0}, order=3)
+
+
+class TimestampPair(PropertyHolder):
+
+    name = StringProperty(title='Name', order=0)
+    # untyped, so that numbers and datetimes are not made strings
+    timestamp_a = Property(title='Timestamp A', order=1)
+    timestamp_b = Property(title='Timestamp B', order=2)
+
+
+class ElapsedTimeMixin(TimestampOptions):
+    """ Computes the time between two timestamps on a signal, in seconds."""
+
+    # untyped, so that numbers and datetimes are not made strings
+    timestamp_a = Property(title='Timestamp A', order=0, allow_none=True)
+    timestamp_b = Property(title='Timestamp B', order=1, allow_none=True)
+
+    parse_cache_size = IntProperty(
+        title='Parse Cache Size',
+        default=0,
+        order=7,
+        advanced=True)
+
+    def configure(self, context):
+        super().configure(context)
+        # parsed datetimes of recently seen strings, by (string, truncate)
+        self._parse = None
+        if self.parse_cache_size() > 0:
+            self._parse = lru_cache(maxsize=self.parse_cache_size())(
+                parse_timestamp)
+        # evaluate properties configured without expressions only once
+        properties = context.properties
+        for name in self._required_timestamps():
+            if properties.get(name) in (None, ''):
+                raise ValueError('{} is required'.format(
+                    name.replace('_', ' ').title()))
+        self._timestamp_a = self.timestamp_a
+        self._timestamp_b = self.timestamp_b
+        if not is_expression(properties.get('timestamp_a')):
+            self._timestamp_a = constant(self.timestamp_a())
+        if not is_expression(properties.get('timestamp_b')):
+            self._timestamp_b = constant(self.timestamp_b())
+
+    def _required_timestamps(self):
+        """ Returns the names of the timestamp properties that must be
+            configured, they can be unset for modes that do not use them"""
+        return ['timestamp_a', 'timestamp_b']
+
+    def parse_cache_info(self):
+        """ Returns a dict of `hits`, `misses`, `size` and `max_size` of the
+            parse cache, or None if it is disabled."""
+        if self._parse is None:
+            return None
+        info = self._parse.cache_info()
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+        }
+
+    def _get_seconds(self, signal, truncate):
+        """Returns the number of seconds between the timestamps on a signal"""
+        return elapsed_seconds(
+            self._get_value(self._timestamp_a(signal), truncate),
+            self._get_value(self._timestamp_b(signal), truncate),
+            truncate,
+            self._epoch_scale)
+
+    def _get_value(self, value, truncate):
+        """ Returns a timestamp property value as a number if it is a
+            numeric string, or as a datetime from the parse cache if it is
+            any other string and the cache is enabled."""
+        value = epoch_value(value)
+        if self._parse is not None and isinstance(value, str):
+            return self._parse(value, truncate)
+        return value
+
+    def _load_timestamp(self, timestamp, truncate=False):
+        if self._parse is not None and isinstance(timestamp, str):
+            return self._parse(timestamp, truncate)
+        return load_timestamp(timestamp, truncate, self._epoch_scale)
+
+
+@command('metrics')
+@output('error', label='Error')
+@output('metrics', label='Metrics')
+@output(DEFAULT_TERMINAL, default=True, label='default')
+class ElapsedTime(Instrumentation, DurationUnits, ElapsedTimeMixin,
+                  EnrichSignals, Block):
+
+    batch_mode = BoolProperty(
+        title='Vectorized Batch Mode',
+        default=False,
+        order=4,
+        advanced=True)
+    parallel = ObjectProperty(
+        Parallel,
+        title='Parallel Mode',
+        default=Parallel(),
+        order=5,
         advanced=True)
-    milliseconds = BoolProperty(
-        title='Include Milliseconds',
-        default=True,
-        order=2,
+    since_previous = ObjectProperty(
+        SincePrevious,
+        title='Time Since Previous Signal',
+        default=SincePrevious(),
+        order=6,
+        advanced=True)
+    columnar = BoolProperty(
+        title='Columnar Output',
+        default=False,
+        order=8,
+        advanced=True)
+    notify_errors = BoolProperty(
+        title='Notify Errors',
+        default=False,
+        order=9,
+        advanced=True)
+    pairs = ListProperty(
+        TimestampPair,
+        title='Timestamp Pairs',
+        default=[],
+        order=10,
         advanced=True)
 
     enrich = ObjectProperty(
@@ -42,94 +185,501 @@ class ElapsedTime(EnrichSignals, Block):
         default=CustomEnrichProperties(),  # use custom default
         order=100,
         advanced=True)
-    version = VersionProperty('0.1.0')
+    version = VersionProperty('0.2.0')
+
+    def __init__(self):
+        super().__init__()
+        self._executor = None
+        # sequence number of the next parallel mode chunk to submit and to
+        # notify, and the results of chunks that are done out of order
+        self._submitted = 0
+        self._delivered = 0
+        self._done = {}
+        self._delivery_lock = Lock()
+        self._previous = None
+        self._previous_lock = Lock()
+
+    def metrics(self):
+        metrics = super().metrics()
+        parse_cache = self.parse_cache_info()
+        if parse_cache is not None:
+            metrics['parse_cache'] = parse_cache
+        return metrics
+
+    def configure(self, context):
+        super().configure(context)
+        # signals that could not be processed
+        self._counters['failures'] = 0
+        self._min_parallel_size = self.parallel().min_list_size()
+        self._chunk_size = max(1, self.parallel().chunk_size())
+        self._batch_mode = self.batch_mode()
+        if self._batch_mode and not _import_numpy():
+            self.logger.warning(
+                'Batch mode requires NumPy, processing signals individually')
+            self._batch_mode = False
+        self._process_signal = self.process_signal
+        if self._metrics_enabled:
+            self._process_signal = self._process_signal_instrumented
+        self._since_previous = self.since_previous().enabled()
+        if self._since_previous:
+            # signals depend on the ones before them, one at a time
+            self._batch_mode = False
+            self._process_signal = self._process_signal_since_previous
+            self._previous = BoundedMap(
+                max_size=self.since_previous().max_groups(),
+                ttl=self.since_previous().timeout().total_seconds())
+        # (name, timestamp a, timestamp b) of each named pair
+        self._pairs = [
+            (pair.name(), pair.timestamp_a, pair.timestamp_b)
+            for pair in self.pairs()
+        ]
+        if self._pairs and self._since_previous:
+            self.logger.warning('Timestamp pairs are not supported with '
+                                'time since previous signal')
+            self._pairs = []
+        # (title, timestamp) properties that are loaded for each signal
+        if self._pairs:
+            self._batch_mode = False
+            self._process_signal = self._process_signal_pairs
+            self._timestamps = []
+            for name, timestamp_a, timestamp_b in self._pairs:
+                self._timestamps.extend([
+                    ('{} Timestamp A'.format(name), timestamp_a),
+                    ('{} Timestamp B'.format(name), timestamp_b),
+                ])
+        elif self._since_previous:
+            self._timestamps = [('Timestamp B', self._timestamp_b)]
+        else:
+            self._timestamps = [('Timestamp A', self._timestamp_a),
+                                ('Timestamp B', self._timestamp_b)]
+        self._notify_errors = self.notify_errors()
+        # enrichment options that are not expressions are evaluated once,
+        # instead of for each output signal
+        self._get_output_signal = self.get_output_signal
+        if not is_expression(context.properties.get('enrich')):
+            self._exclude_existing = self.enrich().exclude_existing()
+            self._enrich_field = self.enrich().enrich_field()
+            self._get_output_signal = self._get_output_signal_static
+        self._columnar = self.columnar()
+        if self._columnar and (self._since_previous or self._pairs):
+            self.logger.warning('Columnar output is not supported with '
+                                'time since previous signal or pairs')
+            self._columnar = False
+
+    def _required_timestamps(self):
+        if self.since_previous().enabled():
+            return ['timestamp_b']
+        if self.pairs():
+            return []
+        return super()._required_timestamps()
+
+    def start(self):
+        super().start()
+        workers = self.parallel().workers()
+        if workers > 0 and not (
+                self._since_previous or self._pairs or self._columnar):
+            # only imported when parallel mode is configured
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def stop(self):
+        if self._executor:
+            # chunks that were already submitted are still notified
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        super().stop()
+
+    def process_signals(self, signals):
+        if self._metrics_enabled:
+            self._record_list(signals)
+        if self._executor and len(signals) >= self._min_parallel_size:
+            self._process_parallel(signals)
+        else:
+            self._notify_results(*self._process_signals(signals))
 
-    def process_signal(self, signal):
-        seconds = self._get_timedelta(signal)
-        signal_dict = self._format_seconds_diff(seconds, signal)
-        output_signal = self.get_output_signal(signal_dict, signal)
+    def _process_signals(self, signals):
+        """ Returns a tuple of output signals and error signals for a list
+            of signals"""
+        try:
+            if self._notify_errors:
+                return self._process_tolerant(signals)
+            return self._process_list(signals), []
+        except Exception:
+            if self._metrics_enabled:
+                self._count('failures')
+            raise
+
+    def _notify_results(self, output_signals, errors):
+        if errors:
+            if self._metrics_enabled:
+                self._count('failures', len(errors))
+            self.notify_signals(errors, output_id='error')
+        self.notify_signals(output_signals)
+
+    def _process_parallel(self, signals):
+        """ Submits a list of signals to the worker pool in chunks, without
+            waiting for them. Each chunk is notified when it and every chunk
+            submitted before it are done, so that signals keep their order
+            and the first chunks are not held back by the rest."""
+        size = self._chunk_size
+        for start in range(0, len(signals), size):
+            with self._delivery_lock:
+                sequence = self._submitted
+                self._submitted += 1
+            future = self._executor.submit(
+                self._process_signals, signals[start:start + size])
+            future.add_done_callback(partial(self._deliver, sequence))
+
+    def _deliver(self, sequence, future):
+        """ Notifies the results of the chunks that are done, in the order
+            they were submitted"""
+        with self._delivery_lock:
+            self._done[sequence] = future
+            while self._delivered in self._done:
+                future = self._done.pop(self._delivered)
+                self._delivered += 1
+                try:
+                    results = future.result()
+                except Exception:
+                    self.logger.exception('Failed to process signals')
+                    continue
+                self._notify_results(*results)
+
+    def _process_list(self, signals, positions=None, timestamps=None):
+        """ Returns the output signals for a list of signals, `positions`
+            are their positions in the incoming list if some were left
+            out, and `timestamps` their already evaluated timestamps."""
+        if self._columnar:
+            output_signals = self._process_columnar(
+                signals, positions, timestamps)
+        elif self._batch_mode and len(signals) > 1:
+            output_signals = self._process_batch(signals, timestamps)
+        elif timestamps is not None:
+            output_signals = [
+                self._process_signal(signal, values)
+                for signal, values in zip(signals, timestamps)
+            ]
+        else:
+            output_signals = [self._process_signal(s) for s in signals]
+        return output_signals
+
+    def _process_tolerant(self, signals):
+        """ Returns a tuple of output signals and error signals, for the
+            signals with timestamps that cannot be loaded. Timestamps are
+            validated by their shape first, so that the list is processed
+            as usual without errors unless a timestamp of a valid shape has
+            invalid values, like a month of 13. Timestamps are only
+            evaluated once, when they are validated."""
+        valid = []
+        positions = []
+        timestamps = []
+        errors = []
+        for position, signal in enumerate(signals):
+            values, reason = self._validate(signal)
+            if reason is None:
+                valid.append(signal)
+                positions.append(position)
+                timestamps.append(values)
+            else:
+                errors.append(self._error_signal(signal, reason))
+        if self._since_previous or self._pairs:
+            # processed one at a time, and with time since previous signal
+            # signals update their group so the list cannot be processed
+            # again
+            output_signals = []
+            for signal, values in zip(valid, timestamps):
+                try:
+                    output_signals.append(
+                        self._process_signal(signal, values))
+                except Exception as error:
+                    errors.append(self._error_signal(signal, str(error)))
+            return output_signals, errors
+        try:
+            return self._process_list(valid, positions, timestamps), errors
+        except Exception:
+            self.logger.debug('Invalid timestamp values, checking each signal')
+        checked = zip(valid, positions, timestamps)
+        valid, positions, timestamps = [], [], []
+        for signal, position, values in checked:
+            try:
+                self._get_nanoseconds(
+                    signal, self._get_options(signal), values)
+            except Exception as error:
+                errors.append(self._error_signal(signal, str(error)))
+            else:
+                valid.append(signal)
+                positions.append(position)
+                timestamps.append(values)
+        return self._process_list(valid, positions, timestamps), errors
+
+    def _validate(self, signal):
+        """ Returns a tuple of the values of the timestamps of a signal, in
+            the order of `_timestamps`, and the reason they cannot be loaded
+            or None if they look valid."""
+        try:
+            values = [
+                epoch_value(timestamp(signal))
+                for _, timestamp in self._timestamps
+            ]
+        except Exception as error:
+            # an expression that cannot be evaluated for this signal
+            return None, str(error)
+        for (title, _), value in zip(self._timestamps, values):
+            reason = self._validate_timestamp(value)
+            if reason is not None:
+                return values, '{}: {}'.format(title, reason)
+        return values, None
+
+    @staticmethod
+    def _validate_timestamp(timestamp):
+        """ Returns the reason a timestamp cannot be loaded, or None. Only
+            strings of an unknown shape are parsed to check them."""
+        if timestamp is None:
+            return 'missing'
+        if is_timestamp_shape(timestamp) or is_number(timestamp) or \
+                isinstance(timestamp, datetime):
+            return None
+        if not isinstance(timestamp, str):
+            return 'not a timestamp: {!r}'.format(timestamp)
+        try:
+            parse_timestamp(timestamp)
+        except ValueError as error:
+            return str(error)
+        return None
+
+    def _get_output_signal_static(self, signal_dict, signal):
+        """ Same as `get_output_signal`, with the enrichment options
+            evaluated at configure"""
+        if self._exclude_existing:
+            # the same signal class as `get_output_signal`
+            return enrich_signals.Signal(signal_dict)
+        output_signal = deepcopy(signal)
+        if self._enrich_field:
+            setattr(output_signal, self._enrich_field, signal_dict)
+        else:
+            output_signal.from_dict(signal_dict)
         return output_signal
 
-    def _get_timedelta(self, signal):
-        """Returns the number of seconds between the timestamps on a signal"""
-        truncate = not self.milliseconds(signal)
-        time_a = self._load_timestamp(
-            self.timestamp_a(signal),
-            truncate=truncate)
-        time_b = self._load_timestamp(
-            self.timestamp_b(signal),
-            truncate=truncate)
-        # subtract datetimes to get timedelta in seconds
-        seconds = (time_b - time_a).total_seconds()
-        if truncate and self.units().seconds(signal):
-            # timedelta.total_seconds() returns a float
-            seconds = int(seconds)
-        return seconds
-
-    def _format_seconds_diff(self, seconds, signal):
-        """ Returns the number of seconds in terms of `units` using `signal`"""
-        days_enabled = self.units().days(signal)
-        hours_enabled = self.units().hours(signal)
-        mins_enabled = self.units().minutes(signal)
-        secs_enabled = self.units().seconds(signal)
-        least_significant = "seconds"
-        least_significant_mult = 1
-
-        if not any([days_enabled, hours_enabled, mins_enabled, secs_enabled]):
-            return {}
-
-        output = {}
-
-        # Go through and remove the most significant values first. Stick the
-        # remainder on the least significant enabled value
-        if days_enabled:
-            least_significant = "days"
-            least_significant_mult = 60 * 60 * 24
-            output["days"] = days = int(seconds / 60 / 60 / 24)
-            seconds -= days * 60 * 60 * 24
-
-        if hours_enabled:
-            least_significant = "hours"
-            least_significant_mult = 60 * 60
-            output["hours"] = hours = int(seconds / 60 / 60)
-            seconds -= hours * 60 * 60
-
-        if mins_enabled:
-            least_significant = "minutes"
-            least_significant_mult = 60
-            output["minutes"] = mins = int(seconds / 60)
-            seconds -= mins * 60
-
-        if secs_enabled:
-            least_significant = "seconds"
-            least_significant_mult = 1
-            output["seconds"] = round(seconds, 3)
-            seconds = 0
-
-        output[least_significant] += seconds / least_significant_mult
-        if secs_enabled and not self.milliseconds(signal):
-            output["seconds"] = int(output["seconds"])
+    @staticmethod
+    def _error_signal(signal, reason):
+        """ Returns a copy of a signal with the reason it failed"""
+        error_signal = Signal(signal.to_dict())
+        error_signal.error = reason
+        return error_signal
 
-        return output
+    def process_signal(self, signal, timestamps=None):
+        options = self._get_options(signal)
+        nanoseconds = self._get_nanoseconds(signal, options, timestamps)
+        signal_dict = self._format_nanoseconds(nanoseconds, options)
+        output_signal = self._get_output_signal(signal_dict, signal)
+        return output_signal
 
-    def _load_timestamp(self, timestamp, truncate=False):
-        """ Returns a datetime object from an ISO 8601 string."""
-        if '.' in timestamp:  # includes milliseconds
-            if truncate:
-                # remove millisecond component
-                _timestamp = timestamp.split('.')
-                timestamp = _timestamp[0] + _timestamp[1][3:]
-                timestamp_format = '%Y-%m-%dT%H:%M:%S'
+    def _process_signal_instrumented(self, signal, timestamps=None):
+        """ Same as `process_signal`, recording metrics."""
+        options = self._get_options(signal)
+        timer = self._start_timer('parse')
+        nanoseconds = self._get_nanoseconds(signal, options, timestamps)
+        self._stop_timer('parse', timer)
+        timer = self._start_timer('format')
+        signal_dict = self._format_nanoseconds(nanoseconds, options)
+        self._stop_timer('format', timer)
+        timer = self._start_timer('enrich')
+        output_signal = self._get_output_signal(signal_dict, signal)
+        self._stop_timer('enrich', timer)
+        return output_signal
+
+    def _process_signal_since_previous(self, signal, timestamps=None):
+        """ Returns an output signal with the time from the previous
+            signal in the same group to this one, using **Timestamp B** of
+            each. The first signal of a group is not enriched."""
+        options = self._get_options(signal)
+        if timestamps is None:
+            current = epoch_value(self._timestamp_b(signal))
+        else:
+            current = timestamps[0]
+        if not is_number(current):
+            # parsed once, and kept for the next signal in the group
+            current = self._load_timestamp(current, truncate=options.truncate)
+        group = self.since_previous().group_by(signal)
+        with self._previous_lock:
+            previous = self._previous.get(group)
+            self._previous.set(group, current)
+        signal_dict = {}
+        if previous is not None:
+            nanoseconds = elapsed_nanoseconds(
+                previous, current, options.truncate, self._epoch_scale)
+            signal_dict = self._format_nanoseconds(nanoseconds, options)
+        return self._get_output_signal(signal_dict, signal)
+
+    def _process_signal_pairs(self, signal, timestamps=None):
+        """ Returns an output signal with the units of each of the named
+            timestamp pairs in an attribute of that name. Timestamps shared
+            by pairs are only loaded once."""
+        options = self._get_options(signal)
+        loaded = {}
+        signal_dict = {}
+        for index, (name, timestamp_a, timestamp_b) in enumerate(self._pairs):
+            if timestamps is None:
+                values = (epoch_value(timestamp_a(signal)),
+                          epoch_value(timestamp_b(signal)))
+            else:
+                values = timestamps[2 * index:2 * index + 2]
+            times = []
+            for value in values:
+                time = loaded.get(value)
+                if time is None:
+                    time = value if is_number(value) else \
+                        self._load_timestamp(value, options.truncate)
+                    loaded[value] = time
+                times.append(time)
+            nanoseconds = elapsed_nanoseconds(
+                times[0], times[1], options.truncate, self._epoch_scale)
+            signal_dict[name] = self._format_nanoseconds(nanoseconds, options)
+        return self._get_output_signal(signal_dict, signal)
+
+    def _get_nanoseconds(self, signal, options, timestamps=None):
+        """ Returns the number of nanoseconds between the timestamps on a
+            signal, or between already evaluated `timestamps`"""
+        if timestamps is None:
+            timestamps = self._timestamp_a(signal), self._timestamp_b(signal)
+        return elapsed_nanoseconds(
+            self._get_value(timestamps[0], options.truncate),
+            self._get_value(timestamps[1], options.truncate),
+            options.truncate,
+            self._epoch_scale)
+
+    def _process_batch(self, signals, timestamps=None):
+        """ Returns output signals for a list of signals, computing deltas
+            with array operations for each group of signals that evaluate
+            to the same units and milliseconds options."""
+        output_signals = [None] * len(signals)
+        for options, indexes in self._group_by_options(signals).items():
+            group = [signals[index] for index in indexes]
+            nanoseconds = self._get_nanoseconds_array(
+                group, options.truncate,
+                self._select(timestamps, indexes))
+            columns = self._format_nanoseconds_array(nanoseconds, options)
+            columns = [(key, values.tolist()) for key, values in columns]
+            for position, (index, signal) in enumerate(zip(indexes, group)):
+                signal_dict = {
+                    key: values[position] for key, values in columns}
+                output_signals[index] = self._get_output_signal(
+                    signal_dict, signal)
+        return output_signals
+
+    def _process_columnar(self, signals, positions=None, timestamps=None):
+        """ Returns a signal for each group of signals that evaluate to the
+            same options, with an array of each unit and an `index` array of
+            the positions of the group's signals in the incoming list."""
+        output_signals = []
+        for options, indexes in self._group_by_options(signals).items():
+            group = [signals[index] for index in indexes]
+            group_timestamps = self._select(timestamps, indexes)
+            if positions is not None:
+                indexes = [positions[index] for index in indexes]
+            if self._batch_mode:
+                nanoseconds = self._get_nanoseconds_array(
+                    group, options.truncate, group_timestamps)
+                columns = dict(
+                    self._format_nanoseconds_array(nanoseconds, options))
+                columns['index'] = np.array(indexes)
             else:
-                timestamp_format = '%Y-%m-%dT%H:%M:%S.%f'
+                columns = {}
+                for position, signal in enumerate(group):
+                    nanoseconds = self._get_nanoseconds(
+                        signal, options, None if group_timestamps is None
+                        else group_timestamps[position])
+                    for unit, value in self._format_nanoseconds(
+                            nanoseconds, options).items():
+                        column = columns.get(unit)
+                        if column is None:
+                            # durations are strings
+                            column = columns[unit] = \
+                                [] if unit == 'duration' else array('d')
+                        column.append(value)
+                columns['index'] = array('l', indexes)
+            output_signals.append(Signal(columns))
+        return output_signals
+
+    def _group_by_options(self, signals):
+        """ Returns a dict of `DurationOptions` to the list of positions of the
+            signals that evaluate to them."""
+        groups = defaultdict(list)
+        for index, signal in enumerate(signals):
+            groups[self._get_options(signal)].append(index)
+        return groups
+
+    @staticmethod
+    def _select(timestamps, indexes):
+        """ Returns the evaluated timestamps at a list of positions, or None
+            if timestamps are not evaluated yet."""
+        if timestamps is None:
+            return None
+        return [timestamps[index] for index in indexes]
+
+    def _get_nanoseconds_array(self, signals, truncate, timestamps=None):
+        """ Returns an int64 array of nanoseconds between the timestamps on
+            signals, or between already evaluated `timestamps`"""
+        if timestamps is None:
+            values_a = [
+                epoch_value(self._timestamp_a(signal)) for signal in signals]
+            values_b = [
+                epoch_value(self._timestamp_b(signal)) for signal in signals]
         else:
-            timestamp_format = '%Y-%m-%dT%H:%M:%S'
-        if timestamp.endswith('Z'):  # UTC timezone
-            timestamp_format += 'Z'
+            values_a = [values[0] for values in timestamps]
+            values_b = [values[1] for values in timestamps]
+        if all(is_number(value) for value in values_a + values_b):
+            # subtract epochs without creating datetimes
+            return self._epoch_nanoseconds_array(values_b, truncate) - \
+                self._epoch_nanoseconds_array(values_a, truncate)
+        time_a = self._load_timestamps(values_a, truncate)
+        time_b = self._load_timestamps(values_b, truncate)
+        return (time_b - time_a).astype('timedelta64[ns]').astype(np.int64)
+
+    def _epoch_nanoseconds_array(self, epochs, truncate):
+        """ Array version of `epoch_nanoseconds`"""
+        epochs = np.array(epochs)
+        multiplier = 10**9 // self._epoch_scale
+        if epochs.dtype.kind == 'f':
+            nanoseconds = np.round(epochs * multiplier).astype(np.int64)
         else:
-            timestamp_format += '%z'
-        # create datetime object from timestamp string
-        time = datetime.strptime(timestamp, timestamp_format)
-        if time.tzinfo is None:  # if UTC the datetime will be offset-naive
-            time = time.replace(tzinfo=timezone.utc)
-        return time
+            nanoseconds = epochs.astype(np.int64) * multiplier
+        if truncate:
+            nanoseconds -= nanoseconds % 10**9
+        return nanoseconds
+
+    @staticmethod
+    def _format_nanoseconds_array(nanoseconds, options):
+        """ Array version of `_format_nanoseconds`, returns a list of
+            `(unit, array)` tuples."""
+        output = []
+        units = enabled_units(options)
+        if units:
+            signs = np.sign(nanoseconds)
+            remainders = np.abs(nanoseconds)
+            for unit, multiplier in units:
+                values, remainders = np.divmod(remainders, multiplier)
+                output.append((unit, signs * values))
+            if has_fraction(options, multiplier):
+                # remainder goes on the least significant enabled unit
+                output[-1] = (
+                    unit, signs * (values + remainders / multiplier))
+        if options.iso_8601:
+            output.append(('duration', np.array(
+                [iso_duration(value) for value in nanoseconds.tolist()],
+                dtype=object)))
+        return output
+
+    def _load_timestamps(self, timestamps, truncate):
+        """ Returns an array of UTC `datetime64[us]` from timestamps."""
+        local_times, offsets = zip(*(
+            split_timestamp(timestamp, truncate=truncate)
+            if isinstance(timestamp, str) else
+            (self._load_timestamp(timestamp, truncate=truncate)
+             .astimezone(timezone.utc).replace(tzinfo=None).isoformat(), 0)
+            for timestamp in timestamps))
+        return np.array(local_times, dtype='datetime64[us]') - \
+            np.array(offsets, dtype='timedelta64[s]')
+
+    def _format_nanoseconds(self, nanoseconds, options):
+        return format_nanoseconds(nanoseconds, options)
@@ -0,0 +1,92 @@
+from threading import Lock
+from nio import Block, Signal
+from nio.modules.scheduler import Job
+from nio.properties import FloatProperty, IntProperty, ListProperty, \
+    TimeDeltaProperty, VersionProperty
+from nio.types import FloatType
+from .elapsed_time_block import ElapsedTimeMixin
+from .histogram import LogHistogram
+
+
+class ElapsedTimeHistogram(ElapsedTimeMixin, Block):
+
+    percentiles = ListProperty(
+        FloatType,
+        title='Percentiles',
+        default=[50, 95, 99],
+        order=10)
+    report_interval = TimeDeltaProperty(
+        title='Report Interval',
+        default={'seconds': 60},
+        order=11)
+    report_count = IntProperty(
+        title='Report Every N Signals',
+        default=0,
+        order=12)
+    relative_accuracy = FloatProperty(
+        title='Relative Accuracy',
+        default=0.01,
+        order=13,
+        advanced=True)
+    version = VersionProperty('0.1.0')
+
+    def __init__(self):
+        super().__init__()
+        self._histogram = None
+        self._histogram_lock = Lock()
+        self._job = None
+
+    def configure(self, context):
+        super().configure(context)
+        self._histogram = LogHistogram(self.relative_accuracy())
+        self._percentiles = self.percentiles()
+        self._report_count = self.report_count()
+
+    def start(self):
+        super().start()
+        interval = self.report_interval()
+        if interval.total_seconds() > 0:
+            self._job = Job(self._report, interval, True)
+
+    def stop(self):
+        if self._job:
+            self._job.cancel()
+            self._job = None
+        super().stop()
+
+    def process_signals(self, signals):
+        summaries = []
+        with self._histogram_lock:
+            for signal in signals:
+                seconds = self._get_seconds(
+                    signal, self._get_truncate(signal))
+                self._histogram.add(seconds)
+                if self._report_count and \
+                        self._histogram.count >= self._report_count:
+                    summaries.append(self._summarize())
+        if summaries:
+            self.notify_signals(summaries)
+
+    def _report(self):
+        """ Notify a summary of the elapsed times since the last report."""
+        with self._histogram_lock:
+            if not self._histogram.count:
+                return
+            summary = self._summarize()
+        self.notify_signals([summary])
+
+    def _summarize(self):
+        """ Returns a summary signal of the histogram and resets it."""
+        histogram = self._histogram
+        summary = {
+            'count': histogram.count,
+            'min': histogram.min,
+            'max': histogram.max,
+            'mean': histogram.mean,
+        }
+        for percentile in self._percentiles:
+            # `p99.9` could not be read by an expression, use `p99_9`
+            name = 'p{:g}'.format(percentile).replace('.', '_')
+            summary[name] = histogram.percentile(percentile)
+        histogram.reset()
+        return Signal(summary)
@@ -0,0 +1,8 @@
+from nio.block.mixins.enrich.enrich_signals import EnrichProperties
+from nio.properties import BoolProperty
+
+
+class CustomEnrichProperties(EnrichProperties):
+    """ Overrides default enrichment to include existing fields."""
+
+    exclude_existing = BoolProperty(title='Exclude Existing?', default=False)
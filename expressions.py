@@ -0,0 +1,16 @@
+def is_expression(value):
+    """ Returns True if a configured property value, or any value nested
+        in it, is an expression that must be evaluated for each signal."""
+    if isinstance(value, dict):
+        return any(is_expression(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(is_expression(item) for item in value)
+    return isinstance(value, str) and '{{' in value
+
+
+def constant(value):
+    """ Returns a function with the signature of an evaluated property
+        that always returns `value`."""
+    def evaluate(signal=None):
+        return value
+    return evaluate
@@ -0,0 +1,73 @@
+from collections import defaultdict
+from math import ceil, log
+
+
+class LogHistogram(object):
+    """ A histogram of values in logarithmically sized buckets.
+
+    Percentiles are accurate to within `relative_accuracy` of the true
+    value, and the number of buckets only grows with the logarithm of the
+    range of values, not with the number of values added. Values smaller
+    in magnitude than `min_value` are counted as zero.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-9):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = log(self._gamma)
+        self._min_value = min_value
+        self.reset()
+
+    def reset(self):
+        """ Removes all values from the histogram."""
+        # bucket index -> count, negative values have negative indexes
+        self._buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """ Adds a single value to the histogram."""
+        self._buckets[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percentile):
+        """ Returns the value at `percentile` (0 to 100), or None if the
+            histogram is empty."""
+        if not self.count:
+            return None
+        rank = percentile / 100 * (self.count - 1)
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                break
+        # the bucket's value can not be outside of the exact min and max
+        return min(max(self._value(index), self.min), self.max)
+
+    def _index(self, value):
+        magnitude = abs(value)
+        if magnitude < self._min_value:
+            return 0
+        index = ceil(log(magnitude / self._min_value) / self._log_gamma) + 1
+        return index if value > 0 else -index
+
+    def _value(self, index):
+        """ Returns the value with the least relative error to all values
+            in the bucket at `index`."""
+        if not index:
+            return 0.0
+        upper = self._min_value * self._gamma ** (abs(index) - 1)
+        value = 2 * upper / (self._gamma + 1)
+        return value if index > 0 else -value
@@ -0,0 +1,115 @@
+from threading import Lock
+from time import perf_counter
+from nio import Signal
+from nio.modules.scheduler import Job
+from nio.properties import BoolProperty, IntProperty, ObjectProperty, \
+    PropertyHolder, TimeDeltaProperty
+
+
+class InstrumentationProperties(PropertyHolder):
+
+    enabled = BoolProperty(title='Enabled', default=False, order=0)
+    sample_every = IntProperty(
+        title='Time One In N Calls', default=100, order=1)
+    report_interval = TimeDeltaProperty(
+        title='Report Interval', default={'seconds': 0}, order=2)
+
+
+class Instrumentation(object):
+    """ Counters and sampled timers for a block's hot paths.
+
+    Blocks using this mixin declare a `metrics` command and a `metrics`
+    output terminal. Metrics are only collected when enabled, blocks should
+    check `_metrics_enabled` (or bind instrumented functions in
+    `configure`) so that there is no overhead otherwise.
+    """
+
+    instrumentation = ObjectProperty(
+        InstrumentationProperties,
+        title='Instrumentation',
+        default=InstrumentationProperties(),
+        order=101,
+        advanced=True)
+
+    def configure(self, context):
+        super().configure(context)
+        self._metrics_enabled = self.instrumentation().enabled()
+        self._sample_every = max(1, self.instrumentation().sample_every())
+        self._metrics_lock = Lock()
+        self._metrics_job = None
+        # name -> value
+        self._counters = {
+            'signals': 0,
+            'lists': 0,
+            'max_list_size': 0,
+        }
+        # name -> number of calls, sampled or not
+        self._timer_calls = {}
+        # name -> [samples, total seconds, max seconds]
+        self._timers = {}
+
+    def start(self):
+        super().start()
+        interval = self.instrumentation().report_interval()
+        if self._metrics_enabled and interval.total_seconds() > 0:
+            self._metrics_job = Job(self._report_metrics, interval, True)
+
+    def stop(self):
+        if self._metrics_job:
+            self._metrics_job.cancel()
+            self._metrics_job = None
+        super().stop()
+
+    def metrics(self):
+        """ Returns a dict of counters and timers, timer values are in
+            microseconds."""
+        with self._metrics_lock:
+            metrics = dict(self._counters)
+            metrics['timers'] = {
+                name: {
+                    'samples': samples,
+                    'mean_us': total / samples * 1e6,
+                    'max_us': maximum * 1e6,
+                }
+                for name, (samples, total, maximum) in self._timers.items()
+            }
+        metrics['enabled'] = self._metrics_enabled
+        return metrics
+
+    def _report_metrics(self):
+        self.notify_signals([Signal(self.metrics())], output_id='metrics')
+
+    def _record_list(self, signals):
+        """ Count a list of incoming signals."""
+        size = len(signals)
+        with self._metrics_lock:
+            counters = self._counters
+            counters['signals'] += size
+            counters['lists'] += 1
+            if size > counters['max_list_size']:
+                counters['max_list_size'] = size
+
+    def _count(self, name, value=1):
+        with self._metrics_lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _start_timer(self, name):
+        """ Returns a start time for one in every `sample_every` calls with
+            the same `name`, otherwise None."""
+        calls = self._timer_calls.get(name, 0)
+        self._timer_calls[name] = calls + 1
+        if calls % self._sample_every:
+            return None
+        return perf_counter()
+
+    def _stop_timer(self, name, start):
+        """ Record the time since `start`, if the call was sampled."""
+        if start is None:
+            return
+        elapsed = perf_counter() - start
+        with self._metrics_lock:
+            timer = self._timers.setdefault(name, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += elapsed
+            if elapsed > timer[2]:
+                timer[2] = elapsed
@@ -0,0 +1,97 @@
+from threading import Lock
+from nio import Block
+from nio.block.mixins import EnrichSignals
+from nio.block.terminals import DEFAULT_TERMINAL, output
+from nio.properties import BoolProperty, IntProperty, ObjectProperty, \
+    Property, StringProperty, TimeDeltaProperty, VersionProperty
+from .bounded_map import BoundedMap
+from .duration_units import DurationUnits
+from .enrich import CustomEnrichProperties
+from .timestamp_engine import epoch_value, format_nanoseconds, time_ns, \
+    timestamp_nanoseconds
+
+
+@output('late', label='Late')
+@output(DEFAULT_TERMINAL, default=True, label='default')
+class Lateness(DurationUnits, EnrichSignals, Block):
+
+    key = StringProperty(title='Key', default='', order=0, allow_none=True)
+    # untyped, so that numbers and datetimes are not made strings
+    timestamp = Property(
+        title='Event Timestamp', default='{{ $timestamp }}', order=1)
+    allowed_lateness = TimeDeltaProperty(
+        title='Allowed Lateness', default={'seconds': 0}, order=2)
+    route_late = BoolProperty(
+        title='Route Late Signals', default=False, order=3)
+
+    max_keys = IntProperty(
+        title='Max Keys',
+        default=10000,
+        order=8,
+        advanced=True)
+    key_timeout = TimeDeltaProperty(
+        title='Key Timeout',
+        default={'seconds': 0},
+        order=9,
+        advanced=True)
+
+    enrich = ObjectProperty(
+        CustomEnrichProperties,
+        title='Signal Enrichment',
+        default=CustomEnrichProperties(),  # use custom default
+        order=100,
+        advanced=True)
+    version = VersionProperty('0.1.0')
+
+    def __init__(self):
+        super().__init__()
+        self._watermarks = None
+        self._watermarks_lock = Lock()
+
+    def configure(self, context):
+        super().configure(context)
+        self._allowed_ns = int(
+            self.allowed_lateness().total_seconds() * 10**9)
+        self._route_late = self.route_late()
+        # key -> latest event time in integer nanoseconds, keys that are
+        # least recently advanced are evicted or expire first
+        self._watermarks = BoundedMap(
+            max_size=self.max_keys(),
+            ttl=self.key_timeout().total_seconds())
+
+    def process_signals(self, signals):
+        # every signal in a list arrived at the same time
+        arrival = time_ns()
+        output_signals = []
+        late_signals = []
+        with self._watermarks_lock:
+            for signal in signals:
+                output_signal, late = self._process_signal(signal, arrival)
+                if late and self._route_late:
+                    late_signals.append(output_signal)
+                else:
+                    output_signals.append(output_signal)
+        if output_signals:
+            self.notify_signals(output_signals)
+        if late_signals:
+            self.notify_signals(late_signals, output_id='late')
+
+    def _process_signal(self, signal, arrival):
+        """ Returns an enriched signal and whether it is late, advancing
+            the watermark of its key."""
+        options = self._get_options(signal)
+        event = timestamp_nanoseconds(
+            epoch_value(self.timestamp(signal)), options.truncate,
+            self._epoch_scale)
+        key = self.key(signal)
+        watermark = self._watermarks.get(key)
+        if watermark is None or event > watermark:
+            self._watermarks.set(key, event)
+            watermark = event
+        lateness = watermark - event
+        late = lateness > self._allowed_ns
+        return self.get_output_signal({
+            'late': late,
+            'lateness': format_nanoseconds(lateness, options),
+            'delay': format_nanoseconds(arrival - event, options),
+        }, signal), late
@@ -0,0 +1,52 @@
+from nio import Signal
+
+
+class LazyTimestamp(object):
+    """ A clock tick that is only rendered the first time its value is
+        needed, the rendered value is kept."""
+
+    __slots__ = ('_tick', '_render', '_value')
+
+    def __init__(self, tick, render):
+        self._tick = tick
+        self._render = render
+        self._value = None
+
+    def value(self):
+        if self._render is not None:
+            self._value = self._render(self._tick)
+            self._render = None
+        return self._value
+
+    def __eq__(self, other):
+        if isinstance(other, LazyTimestamp):
+            other = other.value()
+        return self.value() == other
+
+    def __hash__(self):
+        return hash(self.value())
+
+    def __str__(self):
+        return str(self.value())
+
+    def __repr__(self):
+        return repr(self.value())
+
+
+class LazyTimestampSignal(Signal):
+    """ A signal that renders `LazyTimestamp` attributes when they are
+        read. All of them are rendered when the attributes are read
+        together through `__dict__`, as when the signal is converted to a
+        dict, copied or serialized."""
+
+    def __getattribute__(self, name):
+        value = super().__getattribute__(name)
+        if name == '__dict__':
+            for attr, attr_value in list(value.items()):
+                if type(attr_value) is LazyTimestamp:
+                    value[attr] = attr_value.value()
+        elif type(value) is LazyTimestamp:
+            value = value.value()
+            # replace the lazy timestamp so it is only checked once
+            setattr(self, name, value)
+        return value
@@ -0,0 +1,145 @@
+from math import ceil
+from threading import Lock
+from nio import Block
+from nio.block.mixins import EnrichSignals
+from nio.block.terminals import DEFAULT_TERMINAL, output
+from nio.modules.scheduler import Job
+from nio.properties import BoolProperty, IntProperty, ObjectProperty, \
+    Property, StringProperty, TimeDeltaProperty, VersionProperty
+from .bounded_map import BoundedMap
+from .duration_units import DurationUnits
+from .enrich import CustomEnrichProperties
+from .timer_wheel import TimerWheel
+from .timestamp_engine import elapsed_nanoseconds, epoch_value, \
+    format_nanoseconds, is_number, load_timestamp
+
+
+@output('timeout', label='Timeout')
+@output(DEFAULT_TERMINAL, default=True, label='default')
+class Stopwatch(DurationUnits, EnrichSignals, Block):
+
+    correlation_id = StringProperty(
+        title='Correlation ID', default='{{ $id }}', order=0)
+    start_event = BoolProperty(
+        title='Start Event', default="{{ $event == 'start' }}", order=1)
+    end_event = BoolProperty(
+        title='End Event', default="{{ $event == 'end' }}", order=2)
+    # untyped, so that numbers and datetimes are not made strings
+    timestamp = Property(
+        title='Timestamp', default='{{ $timestamp }}', order=3)
+    timeout = TimeDeltaProperty(
+        title='Timeout', default={'seconds': 3600}, order=4)
+
+    max_open = IntProperty(
+        title='Max Open',
+        default=1000000,
+        order=8,
+        advanced=True)
+    timeout_resolution = TimeDeltaProperty(
+        title='Timeout Resolution',
+        default={'seconds': 1},
+        order=9,
+        advanced=True)
+
+    enrich = ObjectProperty(
+        CustomEnrichProperties,
+        title='Signal Enrichment',
+        default=CustomEnrichProperties(),  # use custom default
+        order=100,
+        advanced=True)
+    version = VersionProperty('0.1.0')
+
+    def __init__(self):
+        super().__init__()
+        self._open = None
+        self._open_lock = Lock()
+        self._wheel = None
+        self._job = None
+
+    def configure(self, context):
+        super().configure(context)
+        # correlation id -> (wheel tick, start time, start signal), the
+        # oldest are evicted beyond the limit
+        self._open = BoundedMap(max_size=self.max_open())
+        self._resolution = self.timeout_resolution()
+        # one more slot than the timeout, so that a span started late in a
+        # tick does not time out early
+        self._wheel = TimerWheel(ceil(
+            self.timeout().total_seconds() /
+            self._resolution.total_seconds()) + 1)
+
+    def start(self):
+        super().start()
+        self._job = Job(self._expire, self._resolution, True)
+
+    def stop(self):
+        if self._job:
+            self._job.cancel()
+            self._job = None
+        super().stop()
+
+    def process_signals(self, signals):
+        output_signals = []
+        timeouts = []
+        with self._open_lock:
+            for signal in signals:
+                if self.start_event(signal):
+                    timeouts.extend(self._start(signal))
+                elif self.end_event(signal):
+                    output_signal = self._end(signal)
+                    if output_signal is not None:
+                        output_signals.append(output_signal)
+        if output_signals:
+            self.notify_signals(output_signals)
+        if timeouts:
+            self.notify_signals(timeouts, output_id='timeout')
+
+    def _start(self, signal):
+        """ Open a span for a start signal, returns a list of start signals
+            evicted to stay within **Max Open**."""
+        key = self.correlation_id(signal)
+        restarted = self._open.get(key)
+        if restarted is not None:
+            self._wheel.remove(key, restarted[0])
+        entry = (self._wheel.add(key), self._get_time(signal), signal)
+        evicted = self._open.set(key, entry)
+        for evicted_key, evicted_entry in evicted:
+            self._wheel.remove(evicted_key, evicted_entry[0])
+        return [evicted_entry[2] for _, evicted_entry in evicted]
+
+    def _end(self, signal):
+        """ Close the span of an end signal, returns the enriched end signal
+            or None if there is no open span."""
+        key = self.correlation_id(signal)
+        entry = self._open.pop(key)
+        if entry is None:
+            self.logger.debug('No open span for end signal, dropping it')
+            return None
+        self._wheel.remove(key, entry[0])
+        options = self._get_options(signal)
+        nanoseconds = elapsed_nanoseconds(
+            entry[1], self._get_time(signal), options.truncate,
+            self._epoch_scale)
+        return self.get_output_signal(
+            format_nanoseconds(nanoseconds, options), signal)
+
+    def _get_time(self, signal):
+        """ Returns the timestamp of a signal as an epoch number or an
+            offset-aware datetime, so that it is parsed only once."""
+        value = epoch_value(self.timestamp(signal))
+        if is_number(value):
+            return value
+        return load_timestamp(value, epoch_scale=self._epoch_scale)
+
+    def _expire(self):
+        """ Advance the timer wheel and notify start signals that have been
+            open for longer than **Timeout**."""
+        timeouts = []
+        with self._open_lock:
+            # spans are removed from the wheel when they end, restart or
+            # are evicted, so these have all timed out
+            keys, _ = self._wheel.advance()
+            for key in keys:
+                timeouts.append(self._open.pop(key)[2])
+        if timeouts:
+            self.notify_signals(timeouts, output_id='timeout')
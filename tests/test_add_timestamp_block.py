@@ -3,6 +3,8 @@ from unittest.mock import ANY, Mock, patch
 from nio import Signal
 from nio.block.terminals import DEFAULT_TERMINAL
 from nio.testing.block_test_case import NIOBlockTestCase
+from nio.testing.modules.scheduler.scheduler import JumpAheadScheduler
+from safepickle import safepickle as pickle
 from ..add_timestamp_block import AddTimestamp
 
 
@@ -57,7 +59,7 @@ class TestAddTimestamp(NIOBlockTestCase):
         format = '%Y-%m-%dT%H:%M:%S.%f%z'
         # set up mocks for assertions,
         # return a real datetime object for simplicity in testing
-        mock_datetime.now = Mock(return_value=datetime.now())
+        mock_datetime.fromtimestamp = Mock(side_effect=datetime.fromtimestamp)
 
         blk = AddTimestamp()
         config = {'utc': False}
@@ -71,7 +73,8 @@ class TestAddTimestamp(NIOBlockTestCase):
         blk.stop()
 
         # check calls
-        mock_datetime.now.assert_called_once_with()
+        mock_datetime.fromtimestamp.assert_called_once_with(ANY, ANY)
+        mock_datetime.now.assert_not_called()
         mock_datetime.utcnow.assert_not_called()
         # check output
         self.validate_timestamps(format)
@@ -106,3 +109,270 @@ class TestAddTimestamp(NIOBlockTestCase):
                 'custom': ANY,
             }),
         ])
+
+    @patch(AddTimestamp.__module__ + '.datetime')
+    def test_tick_cache(self, mock_datetime):
+        """ Timestamps are rendered once per millisecond tick."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {})
+        blk.start()
+        with patch.object(blk, '_format_time',
+                          wraps=blk._format_time) as format_time:
+            # two lists in the same millisecond, then a new millisecond
+            mock_datetime.utcnow.return_value = \
+                datetime(1984, 5, 3, 5, 45, 0, 142001)
+            blk.process_signals([Signal()])
+            mock_datetime.utcnow.return_value = \
+                datetime(1984, 5, 3, 5, 45, 0, 142999)
+            blk.process_signals([Signal()])
+            self.assertEqual(format_time.call_count, 1)
+            self.assertEqual(
+                self.last_notified[DEFAULT_TERMINAL][1].timestamp,
+                '1984-05-03T05:45:00.142Z')
+            mock_datetime.utcnow.return_value = \
+                datetime(1984, 5, 3, 5, 45, 0, 143000)
+            blk.process_signals([Signal()])
+            self.assertEqual(format_time.call_count, 2)
+        blk.stop()
+        self.assertEqual(
+            self.last_notified[DEFAULT_TERMINAL][2].timestamp,
+            '1984-05-03T05:45:00.143Z')
+
+    def test_static_output_attr(self):
+        """ Output attribute without an expression is evaluated once."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {'output_attr': 'stamped'})
+        blk.start()
+        with patch.object(AddTimestamp, 'output_attr') as output_attr:
+            blk.process_signals([Signal(), Signal()])
+            output_attr.assert_not_called()
+        blk.stop()
+        self.validate_timestamps('%Y-%m-%dT%H:%M:%S.%fZ', attr='stamped')
+
+    @patch(AddTimestamp.__module__ + '.monotonic_ns', return_value=42)
+    @patch(AddTimestamp.__module__ + '.time_ns', return_value=1234)
+    @patch(AddTimestamp.__module__ + '.datetime')
+    def test_clocks(self, mock_datetime, mock_time_ns, mock_monotonic_ns):
+        """ Integer nanosecond clocks are added with or without ISO."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'clocks': {
+                'iso': False,
+                'epoch_ns': True,
+                'monotonic_ns': True,
+            },
+        })
+        blk.start()
+        blk.process_signals([Signal({'foo': 'bar'})])
+        blk.stop()
+        mock_datetime.utcnow.assert_not_called()
+        self.assert_last_signal_list_notified([
+            Signal({
+                'foo': 'bar',
+                'timestamp_epoch_ns': 1234,
+                'timestamp_monotonic_ns': 42,
+            }),
+        ])
+
+        mock_datetime.utcnow.return_value = datetime(2019, 1, 2, 3, 4, 5)
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'clocks': {'epoch_ns': True},
+            'output_attr': '{{ $attr }}',
+        })
+        blk.start()
+        blk.process_signals([Signal({'attr': 'stamp'})])
+        blk.stop()
+        self.assert_last_signal_list_notified([
+            Signal({
+                'attr': 'stamp',
+                'stamp': '2019-01-02T03:04:05.000Z',
+                'stamp_epoch_ns': 1234,
+            }),
+        ])
+
+    def test_metrics(self):
+        """ Metrics are available as a command and on an output."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {})
+        self.assertFalse(blk.metrics()['enabled'])
+
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'instrumentation': {
+                'enabled': True,
+                'sample_every': 1,
+                'report_interval': {'seconds': 1},
+            },
+        })
+        blk.start()
+        blk.process_signals([Signal(), Signal()])
+        blk.process_signals([Signal()])
+        metrics = blk.metrics()
+        self.assertEqual(metrics['signals'], 3)
+        self.assertEqual(metrics['lists'], 2)
+        self.assertEqual(metrics['max_list_size'], 2)
+        self.assertNotIn('failures', metrics)
+        self.assertEqual(metrics['timers']['clock']['samples'], 2)
+        self.assertEqual(metrics['timers']['enrich']['samples'], 2)
+        JumpAheadScheduler.jump_ahead(1)
+        blk.stop()
+        self.assertEqual(len(self.last_notified['metrics']), 1)
+        self.assertEqual(self.last_notified['metrics'][0].signals, 3)
+
+    @patch(AddTimestamp.__module__ + '.time_ns', return_value=1234567891234)
+    def test_output_formats(self, mock_time_ns):
+        """ Epoch, ISO precision and offset, and strftime formats."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'output_format': 'epoch',
+            'precision': 'milliseconds',
+        })
+        blk.start()
+        blk.process_signals([Signal()])
+        blk.stop()
+        self.assertEqual(
+            self.last_notified[DEFAULT_TERMINAL][-1].timestamp, 1234567)
+
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'precision': 'microseconds',
+            'utc_offset': 'hh:mm',
+        })
+        blk.start()
+        blk.process_signals([Signal()])
+        blk.stop()
+        datetime.strptime(
+            self.last_notified[DEFAULT_TERMINAL][-1].timestamp,
+            '%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'utc': False,
+            'output_format': 'strftime',
+            'strftime': '%d/%m/%Y %H:%M:%S%z',
+        })
+        blk.start()
+        blk.process_signals([Signal()])
+        blk.stop()
+        datetime.strptime(
+            self.last_notified[DEFAULT_TERMINAL][-1].timestamp,
+            '%d/%m/%Y %H:%M:%S%z')
+
+    def test_lazy_formatting(self):
+        """ Timestamps are rendered once, when first read."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {'lazy': True})
+        blk.start()
+        with patch.object(blk, '_format_time',
+                          wraps=blk._format_time) as format_time:
+            blk.process_signals([Signal({'foo': 'bar'}), Signal()])
+            format_time.assert_not_called()
+            first, second = self.last_notified[DEFAULT_TERMINAL]
+            timestamp = first.timestamp
+            self.assertIsInstance(timestamp, str)
+            self.assertEqual(second.to_dict()['timestamp'], timestamp)
+            self.assertEqual(format_time.call_count, 1)
+        blk.stop()
+        self.validate_timestamps('%Y-%m-%dT%H:%M:%S.%fZ')
+        self.assertEqual(first.to_dict(), {
+            'foo': 'bar',
+            'timestamp': timestamp,
+        })
+
+    def test_lazy_serialization(self):
+        """ Lazy timestamps are rendered before signals are serialized, and
+            incoming signals are not modified."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {'lazy': True})
+        blk.start()
+        signal = Signal({'foo': 'bar'})
+        blk.process_signals([signal])
+        blk.stop()
+        self.assertIs(type(signal), Signal)
+        self.assertFalse(hasattr(signal, 'timestamp'))
+        notified = self.last_notified[DEFAULT_TERMINAL][-1]
+        loaded = pickle.loads(pickle.dumps(notified))
+        self.assertIsInstance(loaded['timestamp'], str)
+        self.assertEqual(loaded['foo'], 'bar')
+
+        # not supported when signals are modified in place
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'in_place': True,
+            'lazy': True,
+        })
+        blk.start()
+        signal = Signal()
+        blk.process_signals([signal])
+        blk.stop()
+        self.assertIs(type(signal), Signal)
+        self.assertIsInstance(signal.__dict__['timestamp'], str)
+
+    def test_timezone(self):
+        """ An IANA timezone is resolved once, and on command."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'utc': False,
+            'timezone': 'Asia/Kathmandu',
+            'output_format': 'strftime',
+            'strftime': '%z',
+        })
+        blk.start()
+        blk.process_signals([Signal()])
+        self.assertEqual(
+            self.last_notified[DEFAULT_TERMINAL][-1].timestamp, '+0545')
+        with patch(AddTimestamp.__module__ + '.get_timezone') as get_timezone:
+            self.assertEqual(
+                blk.refresh_timezone(), {'timezone': str(get_timezone())})
+            get_timezone.assert_any_call('Asia/Kathmandu')
+        blk.stop()
+
+    def test_in_place(self):
+        """ Incoming signals are modified instead of copied."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'clocks': {'epoch_ns': True},
+            'in_place': True,
+        })
+        blk.start()
+        signals = [Signal({'foo': 'bar'}), Signal({'foo': 'baz'})]
+        blk.process_signals(signals)
+        blk.stop()
+        notified = self.last_notified[DEFAULT_TERMINAL]
+        self.assertIs(notified[0], signals[0])
+        self.assertIs(notified[1], signals[1])
+        self.assertEqual(signals[0].foo, 'bar')
+        self.assertEqual(signals[0].timestamp, signals[1].timestamp)
+        self.assertTrue(hasattr(signals[1], 'timestamp_epoch_ns'))
+        self.validate_timestamps('%Y-%m-%dT%H:%M:%S.%fZ')
+
+        # not supported with a results field
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'enrich': {'enrich_field': 'stamps'},
+            'in_place': True,
+        })
+        blk.start()
+        signal = Signal()
+        blk.process_signals([signal])
+        blk.stop()
+        self.assertIsNot(self.last_notified[DEFAULT_TERMINAL][-1], signal)
+
+    @patch(AddTimestamp.__module__ + '.monotonic_ns')
+    def test_coalesce(self, mock_monotonic_ns):
+        """ Calls within the tolerance reuse the same stamps."""
+        blk = AddTimestamp()
+        self.configure_block(blk, {
+            'clocks': {'monotonic_ns': True},
+            'coalesce': {'milliseconds': 1},
+        })
+        blk.start()
+        for now in [10**9, 10**9 + 999999, 10**9 + 10**6]:
+            mock_monotonic_ns.return_value = now
+            blk.process_signals([Signal()])
+        blk.stop()
+        self.assertEqual(
+            [signal.timestamp_monotonic_ns
+             for signal in self.last_notified[DEFAULT_TERMINAL]],
+            [10**9, 10**9, 10**9 + 10**6])
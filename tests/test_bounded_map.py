@@ -0,0 +1,37 @@
+from unittest import TestCase
+from ..bounded_map import BoundedMap
+
+
+class TestBoundedMap(TestCase):
+
+    def test_max_size(self):
+        """ Least recently set keys are evicted."""
+        bounded = BoundedMap(max_size=2)
+        self.assertEqual(bounded.set('a', 1), [])
+        self.assertEqual(bounded.set('b', 2), [])
+        self.assertEqual(bounded.set('a', 3), [])
+        self.assertEqual(bounded.set('c', 4), [('b', 2)])
+        self.assertEqual(bounded.items(), [('a', 3), ('c', 4)])
+        self.assertEqual(len(bounded), 2)
+
+    def test_ttl(self):
+        """ Keys expire when not set for `ttl` seconds."""
+        now = [0]
+        bounded = BoundedMap(ttl=10, clock=lambda: now[0])
+        bounded.set('a', 1)
+        now[0] = 5
+        bounded.set('b', 2)
+        self.assertEqual(bounded.get('a'), 1)
+        now[0] = 10
+        self.assertIsNone(bounded.get('a'))
+        self.assertIn('b', bounded)
+        now[0] = 20
+        self.assertEqual(bounded.expire(), [('b', 2)])
+        self.assertEqual(len(bounded), 0)
+
+    def test_pop(self):
+        bounded = BoundedMap()
+        bounded.set('a', 1)
+        self.assertEqual(bounded.pop('a'), 1)
+        self.assertIsNone(bounded.pop('a'))
+        self.assertNotIn('a', bounded)
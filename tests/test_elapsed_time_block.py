@@ -1,9 +1,18 @@
-from datetime import timedelta
-from unittest.mock import patch
+from datetime import datetime, timedelta, timezone
+from threading import Event
+from unittest import skipIf
+from unittest.mock import MagicMock, patch
 from nio.block.terminals import DEFAULT_TERMINAL
 from nio.signal.base import Signal
 from nio.testing.block_test_case import NIOBlockTestCase
-from ..elapsed_time_block import ElapsedTime
+from ..duration_units import DurationUnits
+from ..elapsed_time_block import ElapsedTime, ElapsedTimeMixin
+from .. import timestamp_engine
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class RoundedSig(Signal):
@@ -374,3 +383,568 @@ class TestElapsedTime(NIOBlockTestCase):
                 'seconds': -3.142,
             }),
         ])
+
+    def test_enrichment(self, Signal):
+        """ Enrichment options are evaluated once, unless they are
+            expressions."""
+        for enrich, expected in [
+                ({'enrich_field': 'elapsed'},
+                 {'a': 0, 'elapsed': {'seconds': 1}}),
+                ({'exclude_existing': '{{ $a == 0 }}'}, {'seconds': 1}),
+                ({}, {'a': 0, 'seconds': 1})]:
+            with self.subTest(enrich=enrich):
+                blk = ElapsedTime()
+                self.configure_block(blk, {
+                    'enrich': enrich,
+                    'timestamp_a': '{{ $a }}',
+                    'timestamp_b': 1,
+                })
+                blk.start()
+                signal = Signal({'a': 0})
+                blk.process_signals([signal])
+                blk.stop()
+                self.assertEqual(
+                    self.last_notified[DEFAULT_TERMINAL][-1].to_dict(),
+                    expected)
+                # incoming signals are not modified
+                self.assertEqual(signal.to_dict(), {'a': 0})
+
+    @skipIf(numpy is None, 'batch mode requires NumPy')
+    def test_batch_mode(self, Signal):
+        """ Batch mode output is the same as processing signals one by one."""
+        config = {
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': '{{ $b }}',
+            'milliseconds': '{{ $ms }}',
+            'units': {
+                'days': '{{ $days }}',
+                'hours': '{{ $hours }}',
+                'minutes': False,
+                'seconds': '{{ $seconds }}',
+            },
+        }
+        signals = []
+        for ms in (True, False):
+            for days, hours, seconds in [(False, False, True),
+                                         (True, True, True),
+                                         (False, True, False),
+                                         (False, False, False)]:
+                signals.extend([
+                    Signal({
+                        'a': self.timestamp_a, 'b': self.timestamp_b,
+                        'ms': ms, 'days': days, 'hours': hours,
+                        'seconds': seconds,
+                    }),
+                    Signal({
+                        'a': '1984-05-04T12:42:03.142-05:00',
+                        'b': '1984-5-3T00:00:00Z',
+                        'ms': ms, 'days': days, 'hours': hours,
+                        'seconds': seconds,
+                    }),
+                ])
+
+        blk = ElapsedTime()
+        self.configure_block(blk, config)
+        blk.start()
+        blk.process_signals(signals)
+        blk.stop()
+        expected = [s.to_dict() for s in self.last_notified[DEFAULT_TERMINAL]]
+
+        blk = ElapsedTime()
+        config['batch_mode'] = True
+        self.configure_block(blk, config)
+        blk.start()
+        blk.process_signals(signals)
+        blk.stop()
+        notified = self.last_notified[DEFAULT_TERMINAL][len(expected):]
+        self.assertEqual([s.to_dict() for s in notified], expected)
+
+    def test_static_properties(self, Signal):
+        """ Properties without expressions are evaluated once."""
+        blk = ElapsedTime()
+        config = {
+            'timestamp_a': self.timestamp_a,
+            'timestamp_b': '{{ $timestamp_b }}',
+            'units': {
+                'days': True,
+                'seconds': False,
+            },
+        }
+        self.configure_block(blk, config)
+        blk.start()
+        with patch.object(ElapsedTimeMixin, 'timestamp_a') as timestamp_a, \
+                patch.object(DurationUnits, 'units') as units:
+            blk.process_signals([
+                Signal({'timestamp_b': self.timestamp_b}),
+                Signal({'timestamp_b': self.timestamp_b}),
+            ])
+            timestamp_a.assert_not_called()
+            units.assert_not_called()
+        blk.stop()
+        self.assert_last_signal_list_notified([
+            Signal({
+                'timestamp_b': self.timestamp_b,
+                'days': self.total_days,
+            }),
+            Signal({
+                'timestamp_b': self.timestamp_b,
+                'days': self.total_days,
+            }),
+        ])
+
+    def test_epoch_timestamps(self, Signal):
+        """ Numeric epochs and datetimes are accepted as timestamps."""
+        blk = ElapsedTime()
+        config = {
+            'enrich': {
+                'exclude_existing': True,
+            },
+            'epoch_units': 'milliseconds',
+            'milliseconds': '{{ $ms }}',
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': '{{ $b }}',
+        }
+        self.configure_block(blk, config)
+        blk.start()
+        blk.process_signals([
+            # both epochs
+            Signal({'a': 999, 'b': 2500, 'ms': True}),
+            Signal({'a': 999, 'b': 2500, 'ms': False}),
+            # epoch and ISO 8601
+            Signal({'a': 0, 'b': '1970-01-01T00:00:01.5Z', 'ms': True}),
+            # datetime and epoch
+            Signal({
+                'a': datetime(1970, 1, 1, 5, 45, tzinfo=timezone(
+                    timedelta(hours=5, minutes=45))),
+                'b': 1500,
+                'ms': True,
+            }),
+            # naive datetimes are UTC
+            Signal({'a': datetime(1970, 1, 1), 'b': 2500, 'ms': True}),
+        ])
+        blk.stop()
+        self.assert_last_signal_list_notified([
+            Signal({'seconds': 1.501}),
+            Signal({'seconds': 2}),
+            Signal({'seconds': 1.5}),
+            Signal({'seconds': 1.5}),
+            Signal({'seconds': 2.5}),
+        ])
+
+    def test_raw_timestamp_values(self, Signal):
+        """ Timestamps are passed to the block as evaluated, not as
+            strings, in every mode."""
+        for mode in ({}, {'batch_mode': True}, {'notify_errors': True},
+                     {'pairs': [{'name': 'pair', 'timestamp_a': '{{ $a }}',
+                                 'timestamp_b': '{{ $b }}'}]}):
+            with self.subTest(mode=mode):
+                blk = ElapsedTime()
+                self.configure_block(blk, dict(mode, **{
+                    'enrich': {
+                        'exclude_existing': True,
+                    },
+                    'timestamp_a': '{{ $a }}',
+                    'timestamp_b': '{{ $b }}',
+                }))
+                blk.start()
+                with patch.object(timestamp_engine, 'parse_timestamp') \
+                        as parse:
+                    blk.process_signals([
+                        Signal({'a': datetime(1970, 1, 1), 'b': 2}),
+                        Signal({'a': 1, 'b': 2.5}),
+                    ])
+                    parse.assert_not_called()
+                blk.stop()
+                seconds = [
+                    signal.pair['seconds'] if 'pairs' in mode
+                    else signal.seconds
+                    for signal in self.last_notified[DEFAULT_TERMINAL][-2:]
+                ]
+                self.assertEqual(seconds, [2, 1.5])
+
+    def test_metrics(self, Signal):
+        """ Parse failures and sampled timers are recorded."""
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'instrumentation': {
+                'enabled': True,
+                'sample_every': 2,
+            },
+            'timestamp_a': self.timestamp_a,
+            'timestamp_b': '{{ $b }}',
+        })
+        blk.start()
+        blk.process_signals([Signal({'b': self.timestamp_b})] * 4)
+        with self.assertRaises(ValueError):
+            blk.process_signals([Signal({'b': 'not a timestamp'})])
+        blk.stop()
+        metrics = blk.metrics()
+        self.assertEqual(metrics['signals'], 5)
+        self.assertEqual(metrics['lists'], 2)
+        self.assertEqual(metrics['failures'], 1)
+        for timer in ['parse', 'format', 'enrich']:
+            self.assertEqual(metrics['timers'][timer]['samples'], 2)
+
+    def test_metrics_failures(self, Signal):
+        """ Failures are counted for every way of processing a list."""
+        invalid = [Signal({'b': self.timestamp_b}),
+                   Signal({'b': 'not a timestamp'})]
+        configs = [{'notify_errors': True}, {'columnar': True}]
+        if numpy is not None:
+            configs.append({'batch_mode': True})
+        for config in configs:
+            with self.subTest(config=config):
+                blk = ElapsedTime()
+                self.configure_block(blk, dict(config, **{
+                    'instrumentation': {'enabled': True},
+                    'timestamp_a': self.timestamp_a,
+                    'timestamp_b': '{{ $b }}',
+                }))
+                blk.start()
+                try:
+                    blk.process_signals(invalid)
+                except ValueError:
+                    pass
+                blk.stop()
+                self.assertEqual(blk.metrics()['failures'], 1)
+
+    def test_parallel_mode(self, Signal):
+        """ Large lists are computed in chunks on a worker pool, without
+            blocking the calling thread, and notified in order."""
+        signals = [
+            Signal({'a': '1984-05-04T12:{:02d}:00Z'.format(minute)})
+            for minute in range(60)
+        ]
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'enrich': {
+                'exclude_existing': True,
+            },
+            'parallel': {
+                'workers': 2,
+                'min_list_size': 10,
+                'chunk_size': 7,
+            },
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': self.timestamp_b,
+            'units': {
+                'minutes': True,
+            },
+        })
+        blk.start()
+        # below the minimum list size, on the calling thread
+        blk.process_signals(signals[:9])
+        self.assertEqual(len(self.last_notified[DEFAULT_TERMINAL]), 9)
+        release = Event()
+        process_list = ElapsedTime._process_list
+
+        def wait_for_release(*args, **kwargs):
+            release.wait(5)
+            return process_list(*args, **kwargs)
+
+        with patch.object(ElapsedTime, '_process_list', autospec=True,
+                          side_effect=wait_for_release) as process_chunk:
+            blk.process_signals(signals)
+            # returns before any chunk is done
+            self.assertEqual(len(self.last_notified[DEFAULT_TERMINAL]), 9)
+            release.set()
+            blk.stop()
+        # 60 signals in chunks of 7
+        self.assertEqual(
+            [len(call[0][1]) for call in process_chunk.call_args_list],
+            [7] * 8 + [4])
+        notified = self.last_notified[DEFAULT_TERMINAL]
+        # whole minutes are truncated towards zero
+        minutes = [int((42 - minute) + 3.142 / 60) for minute in range(60)]
+        self.assertEqual([signal.minutes for signal in notified],
+                         minutes[:9] + minutes)
+        self.assertEqual(notified[-1].minutes, -16)
+
+    def test_since_previous(self, Signal):
+        """ Time since the previous signal in each group."""
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'since_previous': {
+                'enabled': True,
+                'group_by': '{{ $device }}',
+                'max_groups': 2,
+            },
+            'timestamp_b': '{{ $time }}',
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'device': 'a', 'time': '2000-01-01T00:00:00Z'}),
+            Signal({'device': 'b', 'time': '2000-01-01T00:00:01Z'}),
+            Signal({'device': 'a', 'time': '2000-01-01T00:00:02.5Z'}),
+        ])
+        self.assert_last_signal_list_notified([
+            Signal({'device': 'a', 'time': '2000-01-01T00:00:00Z'}),
+            Signal({'device': 'b', 'time': '2000-01-01T00:00:01Z'}),
+            Signal({
+                'device': 'a',
+                'time': '2000-01-01T00:00:02.5Z',
+                'seconds': 2.5,
+            }),
+        ])
+        # a third group evicts the least recent, b
+        blk.process_signals([
+            Signal({'device': 'c', 'time': '2000-01-01T00:00:03Z'}),
+            Signal({'device': 'b', 'time': '2000-01-01T00:00:04Z'}),
+            Signal({'device': 'c', 'time': '2000-01-01T00:00:05Z'}),
+        ])
+        blk.stop()
+        self.assert_last_signal_list_notified([
+            Signal({'device': 'c', 'time': '2000-01-01T00:00:03Z'}),
+            Signal({'device': 'b', 'time': '2000-01-01T00:00:04Z'}),
+            Signal({
+                'device': 'c',
+                'time': '2000-01-01T00:00:05Z',
+                'seconds': 2.0,
+            }),
+        ])
+
+    def test_parse_cache(self, Signal):
+        """ Repeated timestamp strings are parsed once."""
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'enrich': {
+                'exclude_existing': True,
+            },
+            'parse_cache_size': 2,
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': self.timestamp_b,
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'a': self.timestamp_a}),
+            Signal({'a': self.timestamp_a}),
+            Signal({'a': 0}),
+        ])
+        blk.stop()
+        self.assert_last_signal_list_notified([
+            Signal({'seconds': self.total_seconds}),
+            Signal({'seconds': self.total_seconds}),
+            Signal({'seconds': 452522523.142}),
+        ])
+        self.assertEqual(blk.parse_cache_info(), {
+            'hits': 3,
+            'misses': 2,
+            'size': 2,
+            'max_size': 2,
+        })
+        self.assertEqual(blk.metrics()['parse_cache']['hits'], 3)
+
+    def test_columnar(self, Signal):
+        """ One signal of unit arrays for each group of options."""
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'columnar': True,
+            'milliseconds': '{{ $ms }}',
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': 90.5,
+            'units': {
+                'minutes': True,
+            },
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'a': 0, 'ms': True}),
+            Signal({'a': 0, 'ms': False}),
+            Signal({'a': 30, 'ms': True}),
+        ])
+        blk.stop()
+        notified = self.last_notified[DEFAULT_TERMINAL]
+        self.assertEqual(len(notified), 2)
+        self.assertEqual(list(notified[0].index), [0, 2])
+        self.assertEqual(list(notified[0].minutes), [1, 1])
+        self.assertEqual(list(notified[0].seconds), [30.5, 0.5])
+        self.assertEqual(list(notified[1].index), [1])
+        self.assertEqual(list(notified[1].seconds), [30])
+
+    def test_nanosecond_units(self, Signal):
+        """ Sub-second and weeks units, and ISO 8601 durations."""
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'enrich': {
+                'exclude_existing': True,
+            },
+            'epoch_units': 'nanoseconds',
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': '{{ $b }}',
+            'units': {
+                'weeks': True,
+                'seconds': False,
+                'milliseconds': True,
+                'microseconds': True,
+                'nanoseconds': True,
+                'iso_8601': True,
+            },
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'a': 1, 'b': 1234567}),
+            Signal({'a': self.timestamp_b, 'b': self.timestamp_a}),
+        ])
+        blk.stop()
+        self.assert_last_signal_list_notified([
+            Signal({
+                'weeks': 0,
+                'milliseconds': 1,
+                'microseconds': 234,
+                'nanoseconds': 566,
+                'duration': 'PT0.001234566S',
+            }),
+            Signal({
+                'weeks': 0,
+                'milliseconds': -132123142,
+                'microseconds': 0,
+                'nanoseconds': 0,
+                'duration': '-P1DT12H42M3.142S',
+            }),
+        ])
+
+    def test_notify_errors(self, Signal):
+        """ Signals with invalid timestamps are notified on the error
+            output, the rest of the list is processed."""
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'enrich': {
+                'exclude_existing': True,
+            },
+            'notify_errors': True,
+            'timestamp_a': self.timestamp_a,
+            'timestamp_b': '{{ $b }}',
+        })
+        blk.start()
+        signals = [
+            Signal({'b': self.timestamp_b}),
+            Signal({'b': 'yesterday'}),
+            Signal({'b': None}),
+            # valid shape, invalid month
+            Signal({'b': '1984-13-04T12:42:03Z'}),
+            Signal({'b': self.timestamp_b}),
+        ]
+        blk.process_signals(signals)
+        blk.stop()
+        self.assert_last_signal_list_notified([
+            Signal({'seconds': self.total_seconds}),
+            Signal({'seconds': self.total_seconds}),
+        ])
+        errors = self.last_notified['error']
+        self.assertEqual([error.b for error in errors],
+                         ['yesterday', None, '1984-13-04T12:42:03Z'])
+        self.assertTrue(errors[0].error.startswith('Timestamp B: '))
+        self.assertEqual(errors[1].error, 'Timestamp B: missing')
+
+    def test_notify_errors_evaluated_once(self, Signal):
+        """ Timestamps are evaluated once, when they are validated."""
+        for batch_mode in (False, True):
+            with self.subTest(batch_mode=batch_mode):
+                blk = ElapsedTime()
+                self.configure_block(blk, {
+                    'batch_mode': batch_mode,
+                    'notify_errors': True,
+                    'timestamp_a': 0,
+                    'timestamp_b': '{{ $b() }}',
+                })
+                blk.start()
+                timestamps = [MagicMock(return_value=5) for _ in range(2)]
+                blk.process_signals(
+                    [Signal({'b': timestamp}) for timestamp in timestamps])
+                blk.stop()
+                for timestamp in timestamps:
+                    timestamp.assert_called_once_with()
+                self.assertEqual(
+                    [signal.seconds for signal in
+                     self.last_notified[DEFAULT_TERMINAL][-2:]],
+                    [5, 5])
+
+    def test_columnar_errors(self, Signal):
+        """ The index of columnar output is the position in the incoming
+            list, not counting signals notified as errors."""
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'columnar': True,
+            'notify_errors': True,
+            'timestamp_a': 0,
+            'timestamp_b': '{{ $b }}',
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'b': 'bad'}),
+            Signal({'b': 5}),
+            # valid shape, invalid month
+            Signal({'b': '1970-13-01T00:00:00Z'}),
+            Signal({'b': 7}),
+        ])
+        blk.stop()
+        notified = self.last_notified[DEFAULT_TERMINAL]
+        self.assertEqual(len(notified), 1)
+        self.assertEqual(list(notified[0].index), [1, 3])
+        self.assertEqual(list(notified[0].seconds), [5, 7])
+        self.assertEqual(len(self.last_notified['error']), 2)
+
+    def test_pairs(self, Signal):
+        """ Named pairs of timestamps in one pass, each parsed once."""
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'enrich': {
+                'exclude_existing': True,
+            },
+            'pairs': [
+                {'name': 'queue', 'timestamp_a': '{{ $received }}',
+                 'timestamp_b': '{{ $started }}'},
+                {'name': 'execute', 'timestamp_a': '{{ $started }}',
+                 'timestamp_b': '{{ $finished }}'},
+                {'name': 'total', 'timestamp_a': '{{ $received }}',
+                 'timestamp_b': '{{ $finished }}'},
+            ],
+        })
+        blk.start()
+        with patch.object(timestamp_engine, 'parse_timestamp',
+                          wraps=timestamp_engine.parse_timestamp) as parse:
+            blk.process_signals([Signal({
+                'received': '2000-01-01T00:00:00Z',
+                'started': '2000-01-01T00:00:01.5Z',
+                'finished': 946684804,
+            })])
+            self.assertEqual(parse.call_count, 2)
+        blk.stop()
+        self.assert_last_signal_list_notified([
+            Signal({
+                'queue': {'seconds': 1.5},
+                'execute': {'seconds': 2.5},
+                'total': {'seconds': 4.0},
+            }),
+        ])
+
+    def test_required_timestamps(self, Signal):
+        """ The timestamps used by the configured mode are required."""
+        for config in [
+                {'timestamp_b': self.timestamp_b},
+                {'timestamp_a': self.timestamp_a},
+                {'since_previous': {'enabled': True}},
+        ]:
+            with self.subTest(config=config):
+                with self.assertRaisesRegex(ValueError, 'is required'):
+                    self.configure_block(ElapsedTime(), config)
+        self.configure_block(ElapsedTime(), {
+            'since_previous': {'enabled': True},
+            'timestamp_b': self.timestamp_b,
+        })
+        self.configure_block(ElapsedTime(), {
+            'pairs': [{'name': 'pair', 'timestamp_a': self.timestamp_a,
+                       'timestamp_b': self.timestamp_b}],
+        })
+        # an expression that evaluates to None
+        blk = ElapsedTime()
+        self.configure_block(blk, {
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': self.timestamp_b,
+            'notify_errors': True,
+        })
+        blk.start()
+        blk.process_signals([Signal({'a': None})])
+        blk.stop()
+        self.assertEqual(self.last_notified['error'][0].error,
+                         'Timestamp A: missing')
@@ -0,0 +1,69 @@
+from unittest.mock import ANY
+from nio import Signal
+from nio.block.terminals import DEFAULT_TERMINAL
+from nio.testing.block_test_case import NIOBlockTestCase
+from nio.testing.modules.scheduler.scheduler import JumpAheadScheduler
+from ..elapsed_time_histogram_block import ElapsedTimeHistogram
+
+
+class TestElapsedTimeHistogram(NIOBlockTestCase):
+
+    def signals(self, count):
+        """ Returns signals with elapsed times of 1 to `count` seconds."""
+        return [
+            Signal({'a': 0, 'b': seconds})
+            for seconds in range(1, count + 1)
+        ]
+
+    def test_report_count(self):
+        """ A summary is notified every N signals."""
+        blk = ElapsedTimeHistogram()
+        self.configure_block(blk, {
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': '{{ $b }}',
+            'report_count': 100,
+            'report_interval': {'seconds': 0},
+        })
+        blk.start()
+        blk.process_signals(self.signals(150))
+        self.assert_num_signals_notified(1)
+        blk.process_signals(self.signals(50))
+        blk.stop()
+        self.assert_num_signals_notified(2)
+        self.assert_last_signal_list_notified([
+            Signal({
+                'count': 100,
+                'min': 1,
+                'max': 150,
+                'mean': ANY,
+                'p50': ANY,
+                'p95': ANY,
+                'p99': ANY,
+            }),
+        ])
+
+    def test_report_interval(self):
+        """ A summary is notified on an interval, if there are values."""
+        blk = ElapsedTimeHistogram()
+        self.configure_block(blk, {
+            'timestamp_a': '{{ $a }}',
+            'timestamp_b': '{{ $b }}',
+            'percentiles': [50, 99.9],
+            'report_interval': {'seconds': 1},
+        })
+        blk.start()
+        blk.process_signals(self.signals(1000))
+        self.assert_num_signals_notified(0)
+        JumpAheadScheduler.jump_ahead(1)
+        self.assert_num_signals_notified(1)
+        summary = self.last_notified[DEFAULT_TERMINAL][0]
+        self.assertEqual(summary.count, 1000)
+        self.assertEqual(summary.min, 1)
+        self.assertEqual(summary.max, 1000)
+        self.assertEqual(summary.mean, 500.5)
+        self.assertAlmostEqual(summary.p50, 500, delta=5)
+        self.assertAlmostEqual(summary.p99_9, 999, delta=10)
+        # nothing to report
+        JumpAheadScheduler.jump_ahead(1)
+        self.assert_num_signals_notified(1)
+        blk.stop()
@@ -0,0 +1,42 @@
+from random import Random
+from unittest import TestCase
+from ..histogram import LogHistogram
+
+
+class TestLogHistogram(TestCase):
+
+    def test_percentiles(self):
+        """ Percentiles are within the relative accuracy."""
+        values = [Random(42).lognormvariate(0, 2) for _ in range(10000)]
+        values.extend([0.0, -1.5, -0.001])
+        histogram = LogHistogram(relative_accuracy=0.01)
+        for value in values:
+            histogram.add(value)
+        values.sort()
+        for percentile in (0, 1, 50, 95, 99, 99.9, 100):
+            expected = values[int(percentile / 100 * (len(values) - 1))]
+            self.assertAlmostEqual(
+                histogram.percentile(percentile), expected,
+                delta=abs(expected) * 0.01)
+        self.assertEqual(histogram.count, len(values))
+        self.assertEqual(histogram.min, -1.5)
+        self.assertEqual(histogram.max, values[-1])
+        self.assertAlmostEqual(histogram.mean, sum(values) / len(values))
+
+    def test_constant_memory(self):
+        """ Number of buckets depends on the range of values only."""
+        histogram = LogHistogram(relative_accuracy=0.02)
+        for _ in range(100):
+            for value in range(1, 1000):
+                histogram.add(value / 1000)
+        self.assertLessEqual(len(histogram._buckets), 175)
+
+    def test_empty_and_reset(self):
+        histogram = LogHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        self.assertIsNone(histogram.mean)
+        histogram.add(3.142)
+        self.assertAlmostEqual(histogram.percentile(50), 3.142)
+        histogram.reset()
+        self.assertEqual(histogram.count, 0)
+        self.assertIsNone(histogram.min)
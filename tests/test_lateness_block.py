@@ -0,0 +1,92 @@
+from datetime import datetime
+from unittest.mock import patch
+from nio import Signal
+from nio.block.terminals import DEFAULT_TERMINAL
+from nio.testing.block_test_case import NIOBlockTestCase
+from ..lateness_block import Lateness
+
+
+@patch(Lateness.__module__ + '.time_ns', return_value=20 * 10**9)
+class TestLateness(NIOBlockTestCase):
+
+    def test_lateness(self, mock_time_ns):
+        """ Signals are enriched with their lateness and delay."""
+        blk = Lateness()
+        self.configure_block(blk, {
+            'key': '{{ $key }}',
+            'allowed_lateness': {'seconds': 1},
+            'enrich': {
+                'exclude_existing': True,
+            },
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'key': 'a', 'timestamp': 10}),
+            Signal({'key': 'a', 'timestamp': '1970-01-01T00:00:12.5Z'}),
+            # within the allowed lateness
+            Signal({'key': 'a', 'timestamp': 11.5}),
+            Signal({'key': 'a', 'timestamp': datetime(1970, 1, 1, 0, 0, 11)}),
+            # each key has its own watermark
+            Signal({'key': 'b', 'timestamp': 11}),
+        ])
+        blk.stop()
+        self.assertEqual(
+            [signal.to_dict() for signal in
+             self.last_notified[DEFAULT_TERMINAL]],
+            [
+                {'late': False, 'lateness': {'seconds': 0},
+                 'delay': {'seconds': 10}},
+                {'late': False, 'lateness': {'seconds': 0},
+                 'delay': {'seconds': 7.5}},
+                {'late': False, 'lateness': {'seconds': 1.0},
+                 'delay': {'seconds': 8.5}},
+                {'late': True, 'lateness': {'seconds': 1.5},
+                 'delay': {'seconds': 9}},
+                {'late': False, 'lateness': {'seconds': 0},
+                 'delay': {'seconds': 9}},
+            ])
+
+    def test_route_late(self, mock_time_ns):
+        """ Late signals are notified on the late output."""
+        blk = Lateness()
+        self.configure_block(blk, {
+            'route_late': True,
+            'units': {
+                'seconds': False,
+                'milliseconds': True,
+            },
+            'epoch_units': 'milliseconds',
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'timestamp': 2000}),
+            Signal({'timestamp': 1000}),
+        ])
+        blk.process_signals([Signal({'timestamp': 3000})])
+        blk.stop()
+        self.assertEqual(len(self.last_notified[DEFAULT_TERMINAL]), 2)
+        self.assertEqual(len(self.last_notified['late']), 1)
+        self.assert_last_signal_notified(Signal({
+            'timestamp': 1000,
+            'late': True,
+            'lateness': {'milliseconds': 1000},
+            'delay': {'milliseconds': 19000},
+        }), output_id='late')
+
+    def test_max_keys(self, mock_time_ns):
+        """ The watermarks of the least recently advanced keys are
+            evicted."""
+        blk = Lateness()
+        self.configure_block(blk, {
+            'key': '{{ $key }}',
+            'max_keys': 1,
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'key': 'a', 'timestamp': 10}),
+            Signal({'key': 'b', 'timestamp': 10}),
+            # the watermark of `a` was evicted
+            Signal({'key': 'a', 'timestamp': 5}),
+        ])
+        blk.stop()
+        self.assertFalse(self.last_notified[DEFAULT_TERMINAL][-1].late)
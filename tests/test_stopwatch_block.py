@@ -0,0 +1,112 @@
+from datetime import datetime
+from nio import Signal
+from nio.block.terminals import DEFAULT_TERMINAL
+from nio.testing.block_test_case import NIOBlockTestCase
+from nio.testing.modules.scheduler.scheduler import JumpAheadScheduler
+from ..stopwatch_block import Stopwatch
+
+
+class TestStopwatch(NIOBlockTestCase):
+
+    def test_pairs(self):
+        """ End events are enriched with the time since their start."""
+        blk = Stopwatch()
+        self.configure_block(blk, {
+            'enrich': {
+                'exclude_existing': True,
+            },
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'id': 1, 'event': 'start', 'timestamp': 10}),
+            Signal({'id': 2, 'event': 'start',
+                    'timestamp': '1970-01-01T00:00:11Z'}),
+            Signal({'id': 1, 'event': 'other', 'timestamp': 11}),
+            Signal({'id': 2, 'event': 'end', 'timestamp': 13.5}),
+            # no open span
+            Signal({'id': 3, 'event': 'end', 'timestamp': 12}),
+        ])
+        blk.process_signals([
+            Signal({'id': 1, 'event': 'end', 'timestamp': 70}),
+            Signal({'id': 1, 'event': 'end', 'timestamp': 80}),
+        ])
+        blk.stop()
+        self.assert_num_signals_notified(2)
+        self.assertEqual(
+            self.last_notified[DEFAULT_TERMINAL][0].to_dict(),
+            {'seconds': 2.5})
+        self.assert_last_signal_notified(Signal({'seconds': 60}))
+
+    def test_datetime_timestamps(self):
+        """ Naive datetimes are UTC, and are compared with numbers."""
+        blk = Stopwatch()
+        self.configure_block(blk, {
+            'enrich': {
+                'exclude_existing': True,
+            },
+        })
+        blk.start()
+        blk.process_signals([
+            Signal({'id': 1, 'event': 'start',
+                    'timestamp': datetime(1970, 1, 1, 0, 0, 10)}),
+            Signal({'id': 1, 'event': 'end', 'timestamp': 12}),
+        ])
+        blk.stop()
+        self.assert_last_signal_notified(Signal({'seconds': 2}))
+
+    def test_timeout(self):
+        """ Spans open for longer than the timeout are notified."""
+        blk = Stopwatch()
+        self.configure_block(blk, {
+            'timeout': {'seconds': 3},
+        })
+        blk.start()
+        start = Signal({'id': 1, 'event': 'start', 'timestamp': 0})
+        blk.process_signals([start])
+        JumpAheadScheduler.jump_ahead(2)
+        # restarting moves the timeout
+        blk.process_signals([start])
+        JumpAheadScheduler.jump_ahead(3)
+        # not before the timeout, and within one resolution after it
+        self.assert_num_signals_notified(0)
+        JumpAheadScheduler.jump_ahead(1)
+        blk.stop()
+        self.assert_num_signals_notified(1, output_id='timeout')
+        self.assert_last_signal_notified(start, output_id='timeout')
+
+    def test_max_open(self):
+        """ The oldest spans are evicted beyond the limit."""
+        blk = Stopwatch()
+        self.configure_block(blk, {
+            'max_open': 2,
+        })
+        blk.start()
+        signals = [
+            Signal({'id': index, 'event': 'start', 'timestamp': 0})
+            for index in range(3)
+        ]
+        blk.process_signals(signals)
+        blk.stop()
+        self.assert_last_signal_list_notified(
+            signals[:1], output_id='timeout')
+
+    def test_wheel_size(self):
+        """ Spans leave the timer wheel when they end or are evicted."""
+        blk = Stopwatch()
+        self.configure_block(blk, {
+            'max_open': 10,
+        })
+        blk.start()
+        for index in range(100):
+            blk.process_signals([
+                Signal({'id': index, 'event': 'start', 'timestamp': 0}),
+                Signal({'id': index, 'event': 'start', 'timestamp': 1}),
+                Signal({'id': index, 'event': 'end', 'timestamp': 2}),
+            ])
+        self.assertEqual(len(blk._wheel), 0)
+        blk.process_signals([
+            Signal({'id': index, 'event': 'start', 'timestamp': 0})
+            for index in range(50)
+        ])
+        self.assertEqual(len(blk._wheel), 10)
+        blk.stop()
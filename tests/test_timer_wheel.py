@@ -0,0 +1,30 @@
+from unittest import TestCase
+from ..timer_wheel import TimerWheel
+
+
+class TestTimerWheel(TestCase):
+
+    def test_expire(self):
+        """ Keys expire after a fixed number of ticks."""
+        wheel = TimerWheel(3)
+        self.assertEqual(wheel.add('a'), 0)
+        self.assertEqual(wheel.advance(), ([], -2))
+        self.assertEqual(wheel.add('b'), 1)
+        self.assertEqual(wheel.add('c'), 1)
+        self.assertEqual(wheel.advance(), ([], -1))
+        self.assertEqual(wheel.advance(), (['a'], 0))
+        self.assertEqual(wheel.advance(), (['b', 'c'], 1))
+        self.assertEqual(wheel.advance(), ([], 2))
+
+    def test_remove(self):
+        """ Removed keys do not expire."""
+        wheel = TimerWheel(2)
+        tick = wheel.add('a')
+        wheel.add('b')
+        wheel.remove('a', tick)
+        # keys that are not in the wheel are ignored
+        wheel.remove('c', tick)
+        self.assertEqual(len(wheel), 1)
+        wheel.advance()
+        self.assertEqual(wheel.advance(), (['b'], 0))
+        self.assertEqual(len(wheel), 0)
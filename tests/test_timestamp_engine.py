@@ -0,0 +1,144 @@
+from datetime import datetime, timezone
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+from .. import timestamp_engine
+from ..timestamp_engine import DurationOptions, elapsed_nanoseconds, \
+    epoch_value, format_nanoseconds, get_timezone, iso_duration, \
+    load_timestamp, strptime_timestamp, timestamp_nanoseconds
+from ..timestamp_parser import parse_timestamp as parse_python
+
+
+class TestTimestampEngine(TestCase):
+
+    timestamps = [
+        '1984-05-03T05:45:00Z',
+        '1984-05-03T05:45:00.1Z',
+        '1984-05-03T05:45:00.142857Z',
+        '1984-05-03T11:30:00.142+0545',
+        '1984-05-03T11:30:00+05:45',
+        '1984-05-03T00:45:00.142-05:00',
+        '1984-05-03 11:30:00.142+05:45',
+    ]
+
+    # valid shapes with invalid or unusual values, and invalid shapes
+    odd_timestamps = [
+        '1984-05-03T24:00:00Z',
+        '1984-12-31T24:00:00.000+0545',
+        '1984-05-03T23:60:00Z',
+        '1984-05-03T23:59:60Z',
+        '1984-02-30T00:00:00Z',
+        '1984-00-03T00:00:00Z',
+        '0000-05-03T00:00:00Z',
+        '1984-05-03T00:00:00+2400',
+        '1984-05-03T00:00:00+0560',
+        '1984-05-03T00:00:00+23:59',
+        '1984-05-03T00:00:00-00:00',
+        '1984-05-03T00:00:00.1234567Z',
+        '1984-05-03t00:00:00Z',
+        '1984-05-03T00:00:00z',
+        '1984-05-03T00:00:00,5Z',
+        '1984-05-03T00:00:00+05',
+        '1984-05-03T00:00:00+5:45',
+        '1984-05-03T 1:00:00Z',
+        '1984-05-03T00:00:00 Z',
+    ]
+
+    @skipIf(timestamp_engine.ciso8601 is None, 'ciso8601 is not installed')
+    def test_backends_parity(self):
+        """ Both backends accept and reject the same odd input."""
+        def parse(parser, timestamp):
+            try:
+                parsed = parser(timestamp)
+            except ValueError:
+                return ValueError
+            return parsed, parsed.utcoffset()
+        for timestamp in self.odd_timestamps:
+            with self.subTest(timestamp=timestamp):
+                self.assertEqual(
+                    parse(timestamp_engine._parse_timestamp_ciso8601,
+                          timestamp),
+                    parse(parse_python, timestamp))
+
+    @skipIf(timestamp_engine.ciso8601 is None, 'ciso8601 is not installed')
+    def test_backends_agree(self):
+        """ The ciso8601 backend accepts exactly what the parsers do."""
+        parse_ciso8601 = timestamp_engine._parse_timestamp_ciso8601
+        for timestamp in self.timestamps:
+            for truncate in (False, True):
+                with self.subTest(timestamp=timestamp, truncate=truncate):
+                    parsed = parse_ciso8601(timestamp, truncate)
+                    expected = parse_python(timestamp, truncate)
+                    self.assertEqual(parsed, expected)
+                    self.assertEqual(parsed.microsecond, expected.microsecond)
+                    self.assertEqual(parsed.utcoffset(), expected.utcoffset())
+        # shapes that ciso8601 would accept on its own are not handed to it
+        self.assertEqual(
+            parse_ciso8601('1984-5-3T05:45:00Z'),
+            strptime_timestamp('1984-5-3T05:45:00Z'))
+        for timestamp in ['1984-05-03', '1984-05-03T05:45:00',
+                          '1984-05-03T05:45:00+9999', '1984-13-03T05:45:00Z']:
+            with self.subTest(timestamp=timestamp):
+                with self.assertRaises(ValueError):
+                    parse_ciso8601(timestamp)
+
+    def test_load_timestamp(self):
+        """ Strings, datetimes and epochs load as aware datetimes."""
+        expected = datetime(1984, 5, 3, 5, 45, tzinfo=timezone.utc)
+        for timestamp in ['1984-05-03T05:45:00.142Z',
+                          datetime(1984, 5, 3, 5, 45, 0, 142000),
+                          452411100142]:
+            with self.subTest(timestamp=timestamp):
+                self.assertEqual(
+                    load_timestamp(timestamp, True, epoch_scale=1000),
+                    expected)
+        with self.assertRaisesRegex(ValueError, 'missing'):
+            load_timestamp(None)
+        self.assertEqual(epoch_value('452411100'), 452411100)
+        self.assertEqual(epoch_value('452411100.5'), 452411100.5)
+        self.assertEqual(epoch_value('1984-05-03T05:45:00Z'),
+                         '1984-05-03T05:45:00Z')
+
+    def test_durations(self):
+        """ Durations are exact integer nanoseconds."""
+        self.assertEqual(elapsed_nanoseconds(
+            '1984-05-03T05:45:00.000001Z', '1984-05-03T11:30:01+0545'),
+            999999000)
+        self.assertEqual(elapsed_nanoseconds(1, 2, epoch_scale=10**9), 1)
+        self.assertEqual(elapsed_nanoseconds(
+            1, '1970-01-01T00:00:02Z', truncate=True), 10**9)
+        options = DurationOptions(
+            truncate=False, weeks=False, days=False, hours=True,
+            minutes=False, seconds=True, milliseconds=False,
+            microseconds=False, nanoseconds=False, iso_8601=True)
+        self.assertEqual(format_nanoseconds(-3601500000000, options), {
+            'hours': -1,
+            'seconds': -1.5,
+            'duration': '-PT1H1.5S',
+        })
+        self.assertEqual(iso_duration(0), 'PT0S')
+        for timestamp, epoch_scale in [
+                ('1970-01-01T00:00:01.5Z', 1), (1500, 1000), (1.5, 1),
+                (datetime(1970, 1, 1, 0, 0, 1, 500000), 1)]:
+            with self.subTest(timestamp=timestamp):
+                self.assertEqual(
+                    timestamp_nanoseconds(timestamp, False, epoch_scale),
+                    1500000000)
+
+    @skipIf(timestamp_engine.ZoneInfo is None,
+            'zoneinfo requires Python 3.9')
+    def test_get_timezone(self):
+        """ Named timezones are cached, the local timezone is refreshed."""
+        self.assertIs(get_timezone('Asia/Kathmandu'),
+                      get_timezone('Asia/Kathmandu'))
+        with patch('tzlocal.reload_localzone') as reload_localzone, \
+                patch('tzlocal.get_localzone') as get_localzone:
+            self.assertEqual(get_timezone(), get_localzone.return_value)
+            reload_localzone.assert_not_called()
+            get_timezone(refresh=True)
+            reload_localzone.assert_called_once_with()
+
+    def test_timezone_names_unavailable(self):
+        """ Timezone names raise ImportError without zoneinfo."""
+        with patch.object(timestamp_engine, 'ZoneInfo', None):
+            with self.assertRaisesRegex(ImportError, 'Python 3.9'):
+                get_timezone('Asia/Kathmandu')
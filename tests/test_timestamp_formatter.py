@@ -0,0 +1,66 @@
+from datetime import datetime, timezone
+from unittest import TestCase, skipIf
+from ..timestamp_formatter import OffsetFormat, OffsetWindow, Precision, \
+    compile_iso, compile_strftime
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+
+class TestTimestampFormatter(TestCase):
+
+    tick = datetime(1984, 5, 3, 5, 45, 0, 142857)
+
+    def test_iso_precision(self):
+        """ Ticks are rendered with the configured precision."""
+        for precision, expected in [
+                (Precision.SECONDS, '1984-05-03T05:45:00Z'),
+                (Precision.MILLISECONDS, '1984-05-03T05:45:00.142Z'),
+                (Precision.MICROSECONDS, '1984-05-03T05:45:00.142857Z')]:
+            with self.subTest(precision=precision):
+                render = compile_iso(precision, OffsetFormat.DEFAULT)
+                self.assertEqual(render(self.tick), expected)
+        # nanosecond ticks are integers
+        render = compile_iso(Precision.NANOSECONDS, OffsetFormat.DEFAULT)
+        self.assertEqual(
+            render(452411100142857143),
+            '1984-05-03T05:45:00.142857143Z')
+
+    def test_utc_offsets(self):
+        """ UTC offset of UTC times in each format."""
+        for offset_format, expected in [
+                (OffsetFormat.DEFAULT, 'Z'),
+                (OffsetFormat.HHMM, '+0000'),
+                (OffsetFormat.HH_MM, '+00:00'),
+                (OffsetFormat.HH, '+00')]:
+            with self.subTest(offset_format=offset_format):
+                render = compile_iso(Precision.SECONDS, offset_format)
+                self.assertEqual(
+                    render(self.tick), '1984-05-03T05:45:00' + expected)
+
+    def test_strftime(self):
+        render = compile_strftime('%d/%m/%Y %H:%M:%S.%f %z')
+        self.assertEqual(
+            render(self.tick), '03/05/1984 05:45:00.142857 +0000')
+
+    @skipIf(ZoneInfo is None, 'zoneinfo requires Python 3.9')
+    def test_offset_window(self):
+        """ Offsets are looked up again only across a DST transition."""
+        window = OffsetWindow(ZoneInfo('Europe/Berlin'))
+        # DST starts at 2021-03-28T01:00:00Z
+        transition = int(datetime(
+            2021, 3, 28, 1, tzinfo=timezone.utc).timestamp())
+        start = transition - 3 * 24 * 60 * 60
+        tzinfo = window.tzinfo(start)
+        self.assertEqual(tzinfo.tzname(None), 'CET')
+        self.assertEqual(window._window[1], transition)
+        self.assertIs(window.tzinfo(transition - 1), tzinfo)
+        tzinfo = window.tzinfo(transition)
+        self.assertEqual(tzinfo.tzname(None), 'CEST')
+        render = compile_iso(
+            Precision.NANOSECONDS, OffsetFormat.HH_MM, window._tz)
+        self.assertEqual(
+            render(transition * 10**9 + 5),
+            '2021-03-28T03:00:00.000000005+02:00')
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+from .. import timestamp_parser
+from ..timestamp_parser import is_timestamp_shape, parse_timestamp, \
+    split_timestamp, strptime_timestamp
+
+
+class TestTimestampParser(TestCase):
+
+    # every shape accepted by ElapsedTime, all representing the same instant
+    timestamps = [
+        '1984-05-03T05:45:00Z',
+        '1984-05-03T05:45:00.1Z',
+        '1984-05-03T05:45:00.142Z',
+        '1984-05-03T05:45:00.142857Z',
+        '1984-05-03T11:30:00+0545',
+        '1984-05-03T11:30:00.142+0545',
+        '1984-05-03T11:30:00.142857+0545',
+        '1984-05-03T11:30:00+05:45',
+        '1984-05-03T11:30:00.142+05:45',
+        '1984-05-03T00:45:00.142-05:00',
+        '1984-05-03 11:30:00.142+05:45',
+    ]
+
+    def test_matches_strptime(self):
+        """ Compiled parsers agree with the original strptime parser."""
+        for timestamp in self.timestamps:
+            for truncate in (False, True):
+                if truncate and ('.142' not in timestamp or
+                                 '.142857' in timestamp):
+                    # strptime can only truncate 3-digit fractions
+                    continue
+                with self.subTest(timestamp=timestamp, truncate=truncate):
+                    expected = strptime_timestamp(
+                        timestamp.replace(' ', 'T'), truncate)
+                    parsed = parse_timestamp(timestamp, truncate)
+                    self.assertEqual(parsed, expected)
+                    self.assertEqual(parsed.utcoffset(), expected.utcoffset())
+
+    def test_truncate(self):
+        """ Fractional seconds are dropped, timezone is kept."""
+        parsed = parse_timestamp('1984-05-03T11:30:00.999+05:45', True)
+        self.assertEqual(
+            parsed,
+            datetime(1984, 5, 3, 11, 30, 0,
+                     tzinfo=timezone(timedelta(hours=5, minutes=45))))
+
+    def test_shape_cache(self):
+        """ One parser is compiled per shape."""
+        timestamp_parser._parsers.clear()
+        parse_timestamp('1984-05-03T05:45:00.142Z')
+        parse_timestamp('2000-01-01T00:00:00.000Z')
+        parse_timestamp('2000-01-01T00:00:00+0000')
+        self.assertEqual(len(timestamp_parser._parsers), 2)
+
+    def test_odd_inputs(self):
+        """ Unrecognized shapes fall back to strptime behavior."""
+        # strptime accepts non-padded fields
+        self.assertEqual(
+            parse_timestamp('1984-5-3T05:45:00Z'),
+            datetime(1984, 5, 3, 5, 45, tzinfo=timezone.utc))
+        for timestamp in ['', 'not a timestamp', '1984-05-03T05:45:00',
+                          '1984-05-03T05:45:00+9999', '1984-13-03T05:45:00Z']:
+            with self.subTest(timestamp=timestamp):
+                with self.assertRaises(ValueError):
+                    parse_timestamp(timestamp)
+
+    def test_is_timestamp_shape(self):
+        """ Shapes are checked without parsing."""
+        self.assertTrue(is_timestamp_shape('1984-05-03T05:45:00.142+05:45'))
+        # values are not checked
+        self.assertTrue(is_timestamp_shape('1984-13-03T05:45:00Z'))
+        for timestamp in ['', 'not a timestamp', '1984-5-3T05:45:00Z', None,
+                          '1984-05-03T05:45:00', 452405100]:
+            with self.subTest(timestamp=timestamp):
+                self.assertFalse(is_timestamp_shape(timestamp))
+
+    def test_split_timestamp(self):
+        """ Timestamps are split into local time and offset seconds."""
+        self.assertEqual(
+            split_timestamp('1984-05-03T11:30:00.142+05:45'),
+            ('1984-05-03T11:30:00.142', 20700))
+        self.assertEqual(
+            split_timestamp('1984-05-03T11:30:00.142-0100', truncate=True),
+            ('1984-05-03T11:30:00', -3600))
+        self.assertEqual(
+            split_timestamp('1984-5-3T05:45:00Z'),
+            ('1984-05-03T05:45:00', 0))
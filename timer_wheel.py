@@ -0,0 +1,34 @@
+class TimerWheel(object):
+    """ Expires keys a fixed number of ticks after they are added.
+
+        Each tick has a slot, and a key is added to the slot of the current
+        tick. Advancing the wheel empties the slot it comes back around to,
+        so adding, removing and expiring a key are constant time however
+        many keys are waiting.
+    """
+
+    def __init__(self, ticks):
+        # keys of each slot, dicts are used as insertion ordered sets
+        self._slots = [{} for _ in range(max(1, ticks))]
+        self.tick = 0
+
+    def __len__(self):
+        return sum(len(slot) for slot in self._slots)
+
+    def add(self, key):
+        """ Adds `key` to the current tick and returns the tick."""
+        self._slots[self.tick % len(self._slots)][key] = None
+        return self.tick
+
+    def remove(self, key, tick):
+        """ Removes `key` that was added at `tick`, if it has not expired."""
+        self._slots[tick % len(self._slots)].pop(key, None)
+
+    def advance(self):
+        """ Advances one tick, returns a `(keys, tick)` tuple of the keys
+            that were added at `tick`, `ticks` ago."""
+        self.tick += 1
+        index = self.tick % len(self._slots)
+        keys = list(self._slots[index])
+        self._slots[index] = {}
+        return keys, self.tick - len(self._slots)
@@ -0,0 +1,253 @@
+""" Timestamp parsing, formatting, clocks, timezones and duration math
+    shared by the blocks in this collection.
+
+    Blocks import from this module rather than from `timestamp_parser` or
+    `timestamp_formatter`, so that the fastest available implementation is
+    used everywhere. Timestamps are parsed with `ciso8601` when it is
+    installed and with the compiled pure-Python parsers otherwise, see
+    `BACKEND`. Durations are integer nanoseconds, so they are exact for
+    any timestamp or epoch resolution.
+"""
+__all__ = [
+    'BACKEND', 'DurationOptions', 'OffsetFormat', 'OffsetWindow',
+    'PRECISION_SCALES', 'Precision', 'TimestampFormat', 'UNIT_NANOSECONDS',
+    'compile_iso', 'compile_strftime', 'elapsed_nanoseconds',
+    'elapsed_seconds', 'enabled_units', 'epoch_nanoseconds', 'epoch_value',
+    'format_nanoseconds', 'get_timezone', 'has_fraction', 'is_number',
+    'is_timestamp_shape', 'iso_duration', 'load_timestamp', 'monotonic_ns',
+    'parse_timestamp', 'shape_of', 'split_timestamp', 'strptime_timestamp',
+    'time_ns', 'timestamp_nanoseconds',
+]
+
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import lru_cache
+# the formatters and parsers are re-exported for the blocks
+from .timestamp_formatter import OffsetFormat, OffsetWindow, Precision, \
+    TimestampFormat, PRECISION_SCALES, compile_iso, compile_strftime
+from .timestamp_parser import is_timestamp_shape, shape_of, \
+    split_timestamp, strptime_timestamp
+from .timestamp_parser import parse_timestamp as _parse_timestamp_python
+
+try:
+    import ciso8601
+except ImportError:  # optional, the pure-Python parsers are used instead
+    ciso8601 = None
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+try:
+    from time import monotonic_ns, time_ns
+except ImportError:  # Python < 3.7
+    from time import monotonic, time
+
+    def monotonic_ns():
+        return int(monotonic() * 1e9)
+
+    def time_ns():
+        return int(time() * 1e9)
+
+
+def _parse_timestamp_ciso8601(timestamp, truncate=False):
+    """ Returns an offset-aware datetime object from an ISO 8601 string
+        using `ciso8601`. Only the shapes accepted by the pure-Python parser
+        are handed to it, so that both backends accept the same input."""
+    shape = shape_of(timestamp)
+    # ciso8601 also accepts an hour of 24, as midnight of the next day
+    if shape is not None and timestamp[11:13] != '24':
+        if truncate and shape[1]:
+            # drop the fraction, cheaper than replacing it after parsing
+            timestamp = timestamp[:19] + timestamp[-shape[0]:]
+        try:
+            return ciso8601.parse_datetime(timestamp)
+        except ValueError:
+            pass
+    return strptime_timestamp(timestamp, truncate)
+
+
+if ciso8601 is not None:
+    BACKEND = 'ciso8601'
+    parse_timestamp = _parse_timestamp_ciso8601
+else:
+    BACKEND = 'python'
+    parse_timestamp = _parse_timestamp_python
+
+
+def epoch_value(value):
+    """ Returns `value` as a number if it is a numeric string, any other
+        value is returned unchanged."""
+    if isinstance(value, str) and ':' not in value:
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return value
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def load_timestamp(timestamp, truncate=False, epoch_scale=1):
+    """ Returns an offset-aware datetime object from an ISO 8601 string, a
+        datetime (offset-naive datetimes are UTC) or a number of epoch units,
+        where `epoch_scale` is the number of epoch units in a second."""
+    if isinstance(timestamp, str):
+        return parse_timestamp(timestamp, truncate=truncate)
+    if timestamp is None:
+        raise ValueError('Timestamp is missing')
+    if isinstance(timestamp, datetime):
+        time = timestamp
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+    else:
+        time = datetime.fromtimestamp(timestamp / epoch_scale, timezone.utc)
+    if truncate:
+        time = time.replace(microsecond=0)
+    return time
+
+
+@lru_cache(maxsize=None)
+def _zone(name):
+    return ZoneInfo(name)
+
+
+def get_timezone(name=None, refresh=False):
+    """ Returns a tzinfo for an IANA timezone name, or the local timezone
+        if `name` is empty. Timezones are cached, use `refresh` to resolve
+        the local timezone again after it has been changed on the system.
+        Raises ImportError for a name on Python < 3.9."""
+    if name:
+        if ZoneInfo is None:
+            raise ImportError('Timezone names require Python 3.9')
+        return _zone(name)
+    # tzlocal is only imported when local time is used
+    from tzlocal import get_localzone, reload_localzone
+    if refresh:
+        reload_localzone()
+    return get_localzone()
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# nanoseconds in each unit, most significant first
+UNIT_NANOSECONDS = [
+    ('weeks', 7 * 24 * 60 * 60 * 10**9),
+    ('days', 24 * 60 * 60 * 10**9),
+    ('hours', 60 * 60 * 10**9),
+    ('minutes', 60 * 10**9),
+    ('seconds', 10**9),
+    ('milliseconds', 10**6),
+    ('microseconds', 10**3),
+    ('nanoseconds', 1),
+]
+
+# units of a formatted duration, `truncate` ignores fractional seconds
+DurationOptions = namedtuple(
+    'DurationOptions',
+    ['truncate'] + [unit for unit, _ in UNIT_NANOSECONDS] + ['iso_8601'])
+
+
+def elapsed_seconds(time_a, time_b, truncate=False, epoch_scale=1):
+    """ Returns the number of seconds from `time_a` to `time_b`"""
+    return elapsed_nanoseconds(time_a, time_b, truncate, epoch_scale) / 10**9
+
+
+def elapsed_nanoseconds(time_a, time_b, truncate=False, epoch_scale=1):
+    """ Returns the integer number of nanoseconds from `time_a` to
+        `time_b`"""
+    if is_number(time_a) and is_number(time_b):
+        # subtract epochs without creating datetimes
+        return epoch_nanoseconds(time_b, truncate, epoch_scale) - \
+            epoch_nanoseconds(time_a, truncate, epoch_scale)
+    delta = load_timestamp(time_b, truncate, epoch_scale) - \
+        load_timestamp(time_a, truncate, epoch_scale)
+    return (delta.days * 86400 + delta.seconds) * 10**9 + \
+        delta.microseconds * 1000
+
+
+def epoch_nanoseconds(epoch, truncate=False, epoch_scale=1):
+    """ Returns a number of epoch units as integer nanoseconds, floored to
+        whole seconds if `truncate`"""
+    if isinstance(epoch, int):
+        nanoseconds = epoch * (10**9 // epoch_scale)
+    else:
+        nanoseconds = int(round(epoch * (10**9 // epoch_scale)))
+    if truncate:
+        nanoseconds -= nanoseconds % 10**9
+    return nanoseconds
+
+
+def timestamp_nanoseconds(timestamp, truncate=False, epoch_scale=1):
+    """ Returns the integer number of nanoseconds since the Unix epoch of
+        an ISO 8601 string, a datetime or a number of epoch units"""
+    if is_number(timestamp):
+        return epoch_nanoseconds(timestamp, truncate, epoch_scale)
+    delta = load_timestamp(timestamp, truncate, epoch_scale) - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10**9 + \
+        delta.microseconds * 1000
+
+
+def format_nanoseconds(nanoseconds, options):
+    """ Returns a dict of a number of nanoseconds in terms of the units in
+        `options`. Each unit is a whole number, except for the least
+        significant unit which includes the remainder as a fraction."""
+    output = {}
+    units = enabled_units(options)
+    if units:
+        sign = -1 if nanoseconds < 0 else 1
+        remainder = abs(nanoseconds)
+        # go through and remove the most significant values first
+        for unit, multiplier in units:
+            value, remainder = divmod(remainder, multiplier)
+            output[unit] = sign * value
+        if has_fraction(options, multiplier):
+            # stick the remainder on the least significant enabled value
+            output[unit] = sign * (value + remainder / multiplier)
+    if options.iso_8601:
+        output['duration'] = iso_duration(nanoseconds)
+    return output
+
+
+@lru_cache(maxsize=None)
+def enabled_units(options):
+    """ Returns a list of `(unit, nanoseconds)` of the units in `options`"""
+    return [
+        (unit, multiplier) for unit, multiplier in UNIT_NANOSECONDS
+        if getattr(options, unit)
+    ]
+
+
+def has_fraction(options, multiplier):
+    """ Returns True if the least significant unit is a float, it is an
+        int for nanoseconds, and when truncated for seconds or less."""
+    return multiplier > 1 and not (options.truncate and multiplier <= 10**9)
+
+
+def iso_duration(nanoseconds):
+    """ Returns an ISO 8601 duration string like `P1DT12H42M3.142S` from a
+        number of nanoseconds, negative durations start with `-`"""
+    seconds, fraction = divmod(abs(nanoseconds), 10**9)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    time = ''
+    if hours:
+        time += '{}H'.format(hours)
+    if minutes:
+        time += '{}M'.format(minutes)
+    if fraction:
+        time += '{}.{}S'.format(
+            seconds, '{:09d}'.format(fraction).rstrip('0'))
+    elif seconds or not (days or time):
+        time += '{}S'.format(seconds)
+    duration = 'P{}D'.format(days) if days else 'P'
+    if time:
+        duration += 'T' + time
+    return '-' + duration if nanoseconds < 0 else duration
@@ -0,0 +1,164 @@
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+
+
+class TimestampFormat(Enum):
+    ISO = 'iso'
+    EPOCH = 'epoch'
+    STRFTIME = 'strftime'
+
+
+class Precision(Enum):
+    SECONDS = 'seconds'
+    MILLISECONDS = 'milliseconds'
+    MICROSECONDS = 'microseconds'
+    NANOSECONDS = 'nanoseconds'
+
+
+class OffsetFormat(Enum):
+    DEFAULT = 'default'  # `Z` for UTC, `±HHMM` for local times
+    HHMM = 'hhmm'
+    HH_MM = 'hh:mm'
+    HH = 'hh'
+
+
+# number of each precision unit in one second
+PRECISION_SCALES = {
+    Precision.SECONDS: 1,
+    Precision.MILLISECONDS: 10**3,
+    Precision.MICROSECONDS: 10**6,
+    Precision.NANOSECONDS: 10**9,
+}
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class OffsetWindow(object):
+    """ The UTC offset of a timezone, looked up once for a window of time
+        without transitions, like the start or end of DST. Finding the
+        offset of a time in the window is an integer comparison.
+    """
+
+    def __init__(self, tz, horizon=7 * 24 * 60 * 60):
+        self._tz = tz
+        # seconds to look ahead for a transition, when none is found the
+        # window is this long
+        self._horizon = horizon
+        # (start epoch, end epoch, fixed offset tzinfo)
+        self._window = (0, 0, None)
+
+    def tzinfo(self, epoch):
+        """ Returns a fixed offset tzinfo of the timezone at `epoch`
+            seconds, named with the timezone's name at that time."""
+        start, end, tzinfo = self._window
+        if not start <= epoch < end:
+            self._window = start, end, tzinfo = self._load(int(epoch))
+        return tzinfo
+
+    def _load(self, epoch):
+        """ Returns the window starting at `epoch`"""
+        offset = self._offset_at(epoch)
+        end = epoch + self._horizon
+        if self._offset_at(end) != offset:
+            # bisect to the first second after the transition
+            low = epoch
+            while end - low > 1:
+                middle = (low + end) // 2
+                if self._offset_at(middle) == offset:
+                    low = middle
+                else:
+                    end = middle
+        local = datetime.fromtimestamp(epoch, timezone.utc).astimezone(
+            self._tz)
+        return epoch, end, timezone(offset, local.tzname())
+
+    def _offset_at(self, epoch):
+        return datetime.fromtimestamp(epoch, timezone.utc).astimezone(
+            self._tz).utcoffset()
+
+
+def compile_iso(precision, offset_format, tz=None):
+    """ Returns a function that renders a clock tick as an ISO 8601 string.
+
+        Ticks are datetimes truncated to `precision`, or integer epoch
+        nanoseconds for nanosecond precision. Datetimes are naive UTC if
+        `tz` is None, otherwise they are local time with a fixed offset
+        tzinfo, see `OffsetWindow`.
+    """
+    offset = compile_offset(offset_format, tz)
+
+    if precision is Precision.NANOSECONDS:
+        window = None if tz is None else OffsetWindow(tz)
+
+        def render(tick):
+            seconds, nanoseconds = divmod(tick, 10**9)
+            if window is None:
+                now = _EPOCH + timedelta(seconds=seconds)
+            else:
+                now = datetime.fromtimestamp(
+                    seconds, window.tzinfo(seconds))
+            return '{:%Y-%m-%dT%H:%M:%S}.{:09d}{}'.format(
+                now, nanoseconds, offset(now))
+    elif precision is Precision.MICROSECONDS:
+        def render(tick):
+            return '{:%Y-%m-%dT%H:%M:%S}.{:06d}{}'.format(
+                tick, tick.microsecond, offset(tick))
+    elif precision is Precision.MILLISECONDS:
+        def render(tick):
+            return '{:%Y-%m-%dT%H:%M:%S}.{:03d}{}'.format(
+                tick, tick.microsecond // 1000, offset(tick))
+    else:
+        def render(tick):
+            return '{:%Y-%m-%dT%H:%M:%S}{}'.format(tick, offset(tick))
+    return render
+
+
+def compile_strftime(pattern, tz=None):
+    """ Returns a function that renders a datetime tick with a `strftime`
+        pattern, `%z` and `%Z` are supported. Ticks are naive UTC if `tz`
+        is None, otherwise they have a fixed offset tzinfo."""
+    if tz is None:
+        def render(tick):
+            return tick.replace(tzinfo=timezone.utc).strftime(pattern)
+    else:
+        def render(tick):
+            return tick.strftime(pattern)
+    return render
+
+
+def compile_offset(offset_format, tz=None):
+    """ Returns a function that returns the UTC offset string of a
+        datetime tick, naive UTC if `tz` is None, otherwise with a fixed
+        offset tzinfo."""
+    if tz is None:
+        offset = {
+            OffsetFormat.DEFAULT: 'Z',
+            OffsetFormat.HHMM: '+0000',
+            OffsetFormat.HH_MM: '+00:00',
+            OffsetFormat.HH: '+00',
+        }[offset_format]
+        return lambda now: offset
+
+    # offset string of each fixed offset tzinfo seen
+    offsets = {}
+
+    def render(now):
+        tzinfo = now.tzinfo
+        offset = offsets.get(tzinfo)
+        if offset is None:
+            offset = offsets[tzinfo] = _format_offset(
+                now.utcoffset(), offset_format)
+        return offset
+    return render
+
+
+def _format_offset(offset, offset_format):
+    """ Returns a timedelta UTC offset as `±HHMM`, `±HH:MM` or `±HH`"""
+    seconds = offset.days * 86400 + offset.seconds
+    sign = '-' if seconds < 0 else '+'
+    hours, minutes = divmod(abs(seconds) // 60, 60)
+    if offset_format is OffsetFormat.HH_MM:
+        return '{}{:02d}:{:02d}'.format(sign, hours, minutes)
+    if offset_format is OffsetFormat.HH:
+        return '{}{:02d}'.format(sign, hours)
+    return '{}{:02d}{:02d}'.format(sign, hours, minutes)
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta, timezone
+
+
+_HAS_FROMISOFORMAT = hasattr(datetime, 'fromisoformat')
+
+# shape key -> compiled parser, see `shape_of`
+_parsers = {}
+# offset string -> tzinfo, e.g. '+0545' and '+05:45'
+_offsets = {'Z': timezone.utc}
+
+
+def parse_timestamp(timestamp, truncate=False):
+    """ Returns an offset-aware datetime object from an ISO 8601 string.
+
+        The shape of `timestamp` is detected and a parser compiled for that
+        shape is cached, so that repeated timestamps of the same shape are
+        parsed without `strptime`. Anything that is not recognized is handed
+        to `strptime_timestamp`, which raises for invalid input.
+    """
+    shape = shape_of(timestamp)
+    if shape is not None:
+        parser = _parsers.get(shape)
+        if parser is None:
+            parser = _parsers[shape] = _compile(*shape)
+        try:
+            return parser(timestamp, truncate)
+        except ValueError:
+            pass
+    return strptime_timestamp(timestamp, truncate)
+
+
+def is_timestamp_shape(timestamp):
+    """ Returns True if `timestamp` is a string in one of the shapes that
+        `parse_timestamp` has a compiled parser for. This is a cheap check
+        of the separators and UTC offset only, the values of the date and
+        time can still be invalid.
+    """
+    return isinstance(timestamp, str) and shape_of(timestamp) is not None
+
+
+def strptime_timestamp(timestamp, truncate=False):
+    """ Returns a datetime object from an ISO 8601 string using `strptime`,
+        this is the original (slow) parser and handles any odd input.
+    """
+    if '.' in timestamp:  # includes milliseconds
+        if truncate:
+            # remove millisecond component
+            _timestamp = timestamp.split('.')
+            timestamp = _timestamp[0] + _timestamp[1][3:]
+            timestamp_format = '%Y-%m-%dT%H:%M:%S'
+        else:
+            timestamp_format = '%Y-%m-%dT%H:%M:%S.%f'
+    else:
+        timestamp_format = '%Y-%m-%dT%H:%M:%S'
+    if timestamp.endswith('Z'):  # UTC timezone
+        timestamp_format += 'Z'
+    else:
+        timestamp_format += '%z'
+    # create datetime object from timestamp string
+    time = datetime.strptime(timestamp, timestamp_format)
+    if time.tzinfo is None:  # if UTC the datetime will be offset-naive
+        time = time.replace(tzinfo=timezone.utc)
+    return time
+
+
+def split_timestamp(timestamp, truncate=False):
+    """ Returns a `(local_time, offset_seconds)` tuple from an ISO 8601
+        string, where `local_time` is the naive ISO 8601 date and time
+        without the UTC offset. Useful for vectorized parsers that cannot
+        handle offsets themselves.
+    """
+    shape = shape_of(timestamp)
+    if shape is not None:
+        body_end = len(timestamp) - shape[0]
+        try:
+            tz = _get_offset(timestamp[body_end:])
+        except ValueError:
+            pass
+        else:
+            offset = tz.utcoffset(None)
+            return (timestamp[:19] if truncate else timestamp[:body_end],
+                    offset.days * 86400 + offset.seconds)
+    time = parse_timestamp(timestamp, truncate)
+    offset = time.utcoffset()
+    return (time.replace(tzinfo=None).isoformat(),
+            offset.days * 86400 + offset.seconds)
+
+
+def shape_of(timestamp):
+    """ Returns a hashable `(offset_length, fraction_digits)` shape for
+        `YYYY-MM-DDTHH:MM:SS[.f](Z|±HHMM|±HH:MM)`, or None if `timestamp`
+        does not look like one of those. A space may separate the date and
+        time, as in `str(datetime)`.
+    """
+    length = len(timestamp)
+    if length < 20 or timestamp[10] not in 'T ' or timestamp[4] != '-' \
+            or timestamp[7] != '-' or timestamp[13] != ':' \
+            or timestamp[16] != ':':
+        return None
+    if timestamp[-1] == 'Z':
+        offset_length = 1
+    elif timestamp[-3] == ':' and timestamp[-6] in '+-':
+        offset_length = 6
+    elif timestamp[-5] in '+-':
+        offset_length = 5
+    else:
+        return None
+    body_length = length - offset_length
+    if body_length == 19:
+        return offset_length, 0
+    fraction_digits = body_length - 20
+    if 0 < fraction_digits <= 6 and timestamp[19] == '.':
+        return offset_length, fraction_digits
+    return None
+
+
+def _compile(offset_length, fraction_digits):
+    """ Returns a parser function for a single timestamp shape."""
+    body_end = 19 + (fraction_digits and fraction_digits + 1)
+    padding = '0' * (6 - fraction_digits)
+
+    def parse(timestamp, truncate):
+        if truncate or not fraction_digits:
+            body = timestamp[:19]
+        else:
+            body = timestamp[:body_end] + padding
+        tz = _get_offset(timestamp[body_end:])
+        return _from_body(body).replace(tzinfo=tz)
+
+    return parse
+
+
+def _get_offset(offset):
+    """ Returns a cached fixed-offset tzinfo for an offset string."""
+    tz = _offsets.get(offset)
+    if tz is None:
+        tz = _offsets[offset] = _load_offset(offset)
+    return tz
+
+
+def _load_offset(offset):
+    """ Returns a fixed-offset tzinfo from a `±HHMM` or `±HH:MM` string."""
+    sign = -1 if offset[0] == '-' else 1
+    hours, minutes = int(offset[1:3]), int(offset[-2:])
+    if offset[1:].replace(':', '') != offset[1:3] + offset[-2:] \
+            or minutes >= 60:
+        raise ValueError('Invalid UTC offset: {}'.format(offset))
+    return timezone(sign * timedelta(hours=hours, minutes=minutes))
+
+
+def _slice_body(body):
+    """ Returns a naive datetime from `YYYY-MM-DDTHH:MM:SS[.ffffff]`"""
+    return datetime(
+        int(body[0:4]), int(body[5:7]), int(body[8:10]),
+        int(body[11:13]), int(body[14:16]), int(body[17:19]),
+        int(body[20:26]) if len(body) > 19 else 0)
+
+
+# `fromisoformat` (Python 3.7+) is implemented in C, prefer it when present
+_from_body = datetime.fromisoformat if _HAS_FROMISOFORMAT else _slice_body